@@ -0,0 +1,7 @@
+"""Vercel entry point: vercel.json rewrites every request public/ can't answer here."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
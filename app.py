@@ -1,27 +1,65 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, session, jsonify
+import json
+import logging
+import queue
+import threading
+import time
+from flask import (
+    Flask, Request, Response, render_template, request, redirect, url_for, flash,
+    send_from_directory, session, jsonify, stream_with_context, current_app
+)
 from werkzeug.utils import secure_filename
+from werkzeug.local import LocalProxy
 from werkzeug.security import check_password_hash
-from PIL import Image
-from config import Config
+from config import (
+    Config, LOGIN_RATE_PER_MIN, LOGIN_BURST, LOGIN_GLOBAL_RATE_PER_MIN, LOGIN_GLOBAL_BURST,
+    LOGIN_LOCKOUT_AFTER, LOGIN_LOCKOUT_BASE, LOGIN_LOCKOUT_MAX, LOGIN_HASH_CONCURRENCY,
+    LOGIN_HASH_WAIT, TRUSTED_PROXIES
+)
+import images
+import metrics
+import assets
+import coldstart
+import components
+import replica
+import search
+import export
+from throttle import LoginThrottle, client_ip
+from concurrency import gather
+from page_cache import cached_page, pages
+from mail_queue import MailQueue
+import bulk_import
 
 from supabase_db import (
-    get_all_products, add_product, delete_product,
-    get_all_blogs, add_blog, delete_blog,
-    get_site_content, update_site_content, add_site_content,
-    upload_to_supabase_storage  # ✅ new
+    get_products_page, get_product, count_products, add_product, update_product, delete_product,
+    update_products, adjust_product_prices, delete_products,
+    get_blogs_page, get_blog, count_blogs, add_blog, update_blog, delete_blog,
+    republish_blogs, delete_blogs,
+    get_site_contents, get_all_site_content, add_site_contents, save_site_contents,
+    cache_stats, breaker
 )
 
 
-from flask_mail import Mail, Message
 from datetime import timedelta
 from functools import wraps
 
+log = logging.getLogger(__name__)
+
 ALLOWED_EXT = {'png', 'jpg', 'jpeg', 'gif'}
 
+DEFAULT_SITE_CONTENT = {
+    'about': 'Royal Radiance — handcrafted candles to light your moments. Edit this in admin.',
+    'special_offer': 'Limited-time: Golden Autumn collection — 20% off!',
+}
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXT
 
+def page_args():
+    """(page, cursor) from the query string for the paginated listings."""
+    page = max(1, request.args.get('page', 1, type=int) or 1)
+    return page, request.args.get('cursor') or None
+
 def admin_required(fn):
     @wraps(fn)
     def wrapper(*a, **kw):
@@ -31,33 +69,72 @@ def admin_required(fn):
         return redirect(url_for('admin_login'))
     return wrapper
 
+class AppRequest(Request):
+    @property
+    def max_content_length(self):
+        # bulk imports carry an image archive; every other form keeps the small limit
+        if self.endpoint == 'admin_products_import':
+            return current_app.config['IMPORT_MAX_CONTENT_LENGTH']
+        return super().max_content_length
+
 def create_app():
     app = Flask(__name__, static_folder='static', template_folder='templates')
+    app.request_class = AppRequest
     app.config.from_object(Config)
+    coldstart.init_app(app)
+    components.init_app(app)
+    metrics.init_app(app)
     # ensure upload folder exists locally
     try:
         os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     except Exception as e:
         # if creation fails on readonly FS, keep going (we handle save errors later)
-        print("⚠️ Could not create upload folder:", e)
+        log.warning("⚠️ Could not create upload folder: %s", e)
 
     UPLOAD_STATIC = os.path.join(app.static_folder, 'uploads')
     os.makedirs(UPLOAD_STATIC, exist_ok=True)
     app.config['UPLOAD_FOLDER'] = UPLOAD_STATIC
     app.config['UPLOAD_STATIC'] = UPLOAD_STATIC
 
-    
-    mail = Mail(app)
+    # Flask-Mail is set up by the queue's sender thread on the first send
+    mail_queue = MailQueue(app)
+    login_throttle = LoginThrottle(
+        rate=LOGIN_RATE_PER_MIN / 60, burst=LOGIN_BURST,
+        global_rate=LOGIN_GLOBAL_RATE_PER_MIN / 60, global_burst=LOGIN_GLOBAL_BURST,
+        lockout_after=LOGIN_LOCKOUT_AFTER, lockout_base=LOGIN_LOCKOUT_BASE, lockout_max=LOGIN_LOCKOUT_MAX,
+        hash_slots=LOGIN_HASH_CONCURRENCY, hash_wait=LOGIN_HASH_WAIT)
+    app.add_template_filter(images.srcset, 'srcset')
+    assets.init_app(app)
+    local_replica = replica.init_app(app)
+    exporter = export.init_app(app)
+    metrics.register_gauges('supabase_cache', cache_stats)
+    metrics.register_gauges('supabase_breaker', breaker.stats)
+    metrics.register_gauges('page_cache', pages.stats)
+    metrics.register_gauges('mail_queue', mail_queue.stats)
+    metrics.register_gauges('search_index', search.index.stats)
+    metrics.register_gauges('login_throttle', login_throttle.stats)
+    metrics.register_gauges('export', exporter.stats)
+    if local_replica is not None:
+        metrics.register_gauges('replica', local_replica.stats)
     app.permanent_session_lifetime = timedelta(seconds=app.config['PERMANENT_SESSION_LIFETIME'])
 
-    # Ensure default site content exists (previously done by SQLAlchemy)
-    try:
-        if get_site_content('about') is None:
-            add_site_content('about', 'Royal Radiance — handcrafted candles to light your moments. Edit this in admin.')
-        if get_site_content('special_offer') is None:
-            add_site_content('special_offer', 'Limited-time: Golden Autumn collection — 20% off!')
-    except Exception as e:
-        print("⚠️ Could not ensure default site content:", e)
+    # No Supabase calls at startup: the defaults are seeded once by
+    # migrations/003_seed_site_content.sql (or `flask seed-content`), and
+    # stand in for missing keys here. Templates read site copy from the cached snapshot:
+    # {{ site_content.about }}
+    site_content = LocalProxy(lambda: {**DEFAULT_SITE_CONTENT, **get_all_site_content()})
+
+    @app.context_processor
+    def inject_site_content():
+        return {'site_content': site_content}
+
+    @app.cli.command('seed-content')
+    def seed_content():
+        """Insert the default site copy for keys that don't exist yet (one request)."""
+        if add_site_contents(DEFAULT_SITE_CONTENT):
+            print(f"✅ Seeded {', '.join(DEFAULT_SITE_CONTENT)} (existing keys kept)")
+        else:
+            print("❌ Could not seed site content — check logs.")
 
     # route to serve uploaded files (templates use url_for('uploads', filename=...))
     @app.route('/uploads/<path:filename>')
@@ -71,47 +148,64 @@ def create_app():
 
     # ------------------------- Public routes -------------------------
     @app.route('/')
+    @cached_page
     def home():
-        products = get_all_products() or []
-        # Defensive: ensure list
-        if not isinstance(products, list):
-            products = []
-        special = get_site_content('special_offer')
-        return render_template('home.html', products=products[:6], special=special or '')
+        # only fetch the cards we show, in parallel with the site copy
+        page, _ = gather(
+            lambda: get_products_page(limit=app.config['HOME_FEATURED_COUNT']),
+            get_all_site_content,
+        )
+        return render_template('home.html', products=page['items'])
 
     @app.route('/about')
+    @cached_page
     def about():
-        about_text = get_site_content('about') or ''
-        return render_template('about.html', about_text=about_text)
+        return render_template('about.html')
 
     @app.route('/catalog')
+    @cached_page
     def catalog():
-        products = get_all_products() or []
-        if not isinstance(products, list):
-            products = []
-        return render_template('catalog.html', products=products)
+        page, cursor = page_args()
+        pager = get_products_page(app.config['PRODUCTS_PER_PAGE'], cursor, page)
+        return render_template('catalog.html', products=pager['items'], pager=pager)
 
     @app.route('/product/<int:pid>')
     def product_api(pid):
-        all_prods = get_all_products() or []
-        p = next((x for x in all_prods if int(x.get('id', 0)) == pid), None)
+        p = get_product(pid)
         if not p:
             return jsonify({'error': 'Product not found'}), 404
         return jsonify(p)
 
     @app.route('/blog')
+    @cached_page
     def blog():
-        posts = get_all_blogs() or []
-        return render_template('blog.html', posts=posts)
+        page, cursor = page_args()
+        pager = get_blogs_page(app.config['BLOGS_PER_PAGE'], cursor, page)
+        return render_template('blog.html', posts=pager['items'], pager=pager)
 
     @app.route('/blog/<int:bid>')
+    @cached_page
     def blog_post(bid):
-        posts = get_all_blogs() or []
-        post = next((x for x in posts if int(x.get('id', 0)) == bid), None)
+        post = get_blog(bid)
         if not post:
             return "Blog not found", 404
         return render_template('blog_post.html', post=post)
 
+    @app.route('/search')
+    def search_page():
+        # answered from the in-memory index; never a Supabase call per query
+        q = request.args.get('q', '').strip()
+        kind = request.args.get('type')
+        results = search.search(q, kind) if q else []
+        if request.args.get('format') == 'json':
+            return jsonify([{
+                'kind': r['kind'], 'id': r['id'], 'title': str(r['title']), 'snippet': str(r['snippet']),
+                'url': url_for('blog_post', bid=r['id']) if r['kind'] == 'blog' else url_for('product_api', pid=r['id']),
+            } for r in results])
+        products = [r for r in results if r['kind'] == 'product']
+        posts = [r for r in results if r['kind'] == 'blog']
+        return render_template('search.html', q=q, products=products, posts=posts)
+
     @app.route('/contact', methods=['GET', 'POST'])
     def contact():
         if request.method == 'POST':
@@ -119,6 +213,7 @@ def create_app():
             email = request.form.get('email')
             msg = request.form.get('message')
             try:
+                from flask_mail import Message
                 message = Message(
                     subject=f"🕯️ New Inquiry from {name}",
                     sender=app.config.get('MAIL_DEFAULT_SENDER'),
@@ -128,25 +223,51 @@ def create_app():
                 bg_url = url_for('static', filename='images/cg.gif', _external=True)
                 message.html = f"<p><b>{name}</b> ({email}) wrote:</p><p>{msg}</p>"
                 message.body = f"From: {name} <{email}>\n\n{msg}"
-                mail.send(message)
+                # spooled and sent by the background worker; no SMTP on this request
+                mail_queue.enqueue(message)
                 flash('Your message was sent successfully!', 'success')
             except Exception as ex:
-                print('Mail error:', ex)
+                log.error("Mail error: %s", ex)
                 flash('Could not send message.', 'warning')
             return redirect(url_for('contact'))
         return render_template('contact.html')
 
     # ------------------------- Admin routes -------------------------
+    def login_refused(reason, retry_after):
+        # plain text and no hash: refusing must cost less than trying
+        metrics.inc('login_attempts_total', (('result', reason),))
+        headers = {'Retry-After': str(retry_after)} if retry_after else {}
+        return Response(f'Too many login attempts. Try again in {retry_after or 1} s.\n', 429, headers,
+                        mimetype='text/plain')
+
     @app.route('/admin/login', methods=['GET', 'POST'])
     def admin_login():
         if request.method == 'POST':
+            ip = client_ip(request, TRUSTED_PROXIES)
+            reason, retry_after = login_throttle.check(ip)
+            if reason:
+                return login_refused(reason, retry_after)
             pwd = request.form.get('password', '')
             stored_hash = app.config.get('ADMIN_PASSWORD_HASH')
-            if check_password_hash(stored_hash, pwd):
+
+            def check():
+                started = time.perf_counter()
+                try:
+                    return check_password_hash(stored_hash, pwd)
+                finally:
+                    metrics.observe('login_hash_seconds', (), time.perf_counter() - started)
+
+            ok = login_throttle.verify(check)
+            if ok is None:
+                return login_refused('busy', 1)
+            metrics.inc('login_attempts_total', (('result', 'ok' if ok else 'wrong'),))
+            if ok:
+                login_throttle.succeeded(ip)
                 session['admin_logged'] = True
                 flash('Login successful!', 'success')
                 return redirect(url_for('admin_dashboard'))
             else:
+                login_throttle.failed(ip)
                 flash('Wrong password', 'danger')
         return render_template('admin_login.html')
 
@@ -159,9 +280,8 @@ def create_app():
     @app.route('/admin')
     @admin_required
     def admin_dashboard():
-        products = get_all_products() or []
-        blogs = get_all_blogs() or []
-        return render_template('admin_dashboard.html', products=len(products), blogs=len(blogs))
+        products, blogs = gather(count_products, count_blogs)
+        return render_template('admin_dashboard.html', products=products, blogs=blogs)
 
     @app.route('/admin/products', methods=['GET', 'POST'])
     @admin_required
@@ -176,29 +296,67 @@ def create_app():
                 price = 0.0
 
             img = request.files.get('image')
-            image_url = None
 
-            if img and allowed_file(img.filename):
+            ok = add_product(name, desc, price, None)
+            if ok and img and allowed_file(img.filename):
                 fname = secure_filename(img.filename)
-                filename = f"prod_{fname}"
-                file_bytes = img.read()
-            # ✅ Upload to Supabase Storage
-                image_url = upload_to_supabase_storage(filename, file_bytes, img.content_type)
-
-            ok = add_product(name, desc, price, image_url)
+            # ✅ Resize/encode + upload to Supabase Storage (off the request thread unless IMAGE_ASYNC is off)
+                done = images.submit(f"prod_{fname}", img.read(), img.content_type, update_product, ok['id'])
+                if isinstance(done, dict) and not done.get('image'):
+                    flash('⚠️ Product saved without its image — the upload failed, check logs.', 'warning')
             if not ok:
                 flash('⚠️ Could not add product to database — check logs.', 'warning')
             else:
                 flash('✅ Product added successfully!', 'success')
             return redirect(url_for('admin_products'))
 
-    # Fetch all products
-        products = get_all_products() or []
-        for p in products:
-            if not p.get('image'):
-                p['image'] = url_for('static', filename='images/no_image.png')
-        return render_template('admin_products.html', products=products)
+    # Fetch one page of products
+        page, cursor = page_args()
+        pager = get_products_page(app.config['ADMIN_PER_PAGE'], cursor, page)
+        # rows come from the shared cache, so copy instead of mutating them
+        no_image = url_for('static', filename='images/no_image.png')
+        products = [dict(p, image=p.get('image') or no_image) for p in pager['items']]
+        return render_template('admin_products.html', products=products, pager=pager)
+
+
+    @app.route('/admin/products/import', methods=['POST'])
+    @admin_required
+    def admin_products_import():
+        manifest = request.files.get('manifest')
+        if not manifest or not manifest.filename:
+            flash('Choose a CSV or JSON manifest to import.', 'warning')
+            return redirect(url_for('admin_products'))
+        try:
+            entries = bulk_import.read_manifest(manifest.stream, manifest.filename)
+        except ValueError as e:
+            flash(f'Could not read manifest: {e}', 'warning')
+            return redirect(url_for('admin_products'))
+        archive = request.files.get('images')
+        try:
+            source = bulk_import.open_source(archive.stream) if archive and archive.filename else None
+        except ValueError as e:
+            flash(f'Could not read images: {e}', 'warning')
+            return redirect(url_for('admin_products'))
+
+        # run the import on a thread and stream its progress as NDJSON lines
+        events = queue.Queue()
+
+        def work():
+            try:
+                results = bulk_import.import_catalog(
+                    entries, source, progress=lambda phase, done, total: events.put(
+                        {'phase': phase, 'done': done, 'total': total}))
+                events.put({'summary': bulk_import.summarize(results), 'results': results})
+            except Exception as e:
+                events.put({'error': str(e)})
+            events.put(None)
 
+        def stream():
+            threading.Thread(target=work, daemon=True).start()
+            while (event := events.get()) is not None:
+                yield json.dumps(event) + '\n'
+
+        return Response(stream_with_context(stream()), mimetype='application/x-ndjson')
 
     @app.route('/admin/blogs', methods=['GET', 'POST'])
     @admin_required
@@ -209,25 +367,24 @@ def create_app():
             content = request.form.get('content')
 
             img = request.files.get('image')
-            image_url = None
 
-            if img and allowed_file(img.filename):
+            ok = add_blog(title, excerpt, content, None)
+            if ok and img and allowed_file(img.filename):
                 fname = secure_filename(img.filename)
-                filename = f"blog_{fname}"
-                file_bytes = img.read()
-            # ✅ Upload to Supabase Storage
-                image_url = upload_to_supabase_storage(filename, file_bytes, img.content_type)
-
-            ok = add_blog(title, excerpt, content, image_url)
+            # ✅ Resize/encode + upload to Supabase Storage (off the request thread unless IMAGE_ASYNC is off)
+                done = images.submit(f"blog_{fname}", img.read(), img.content_type, update_blog, ok['id'])
+                if isinstance(done, dict) and not done.get('image'):
+                    flash('⚠️ Blog saved without its image — the upload failed, check logs.', 'warning')
             if not ok:
                 flash('⚠️ Could not add blog — check logs.', 'warning')
             else:
                 flash('✅ Blog added successfully!', 'success')
             return redirect(url_for('admin_blogs'))
 
-    # Fetch all blog posts
-        posts = get_all_blogs() or []
-        return render_template('admin_blogs.html', posts=posts)
+    # Fetch one page of blog posts
+        page, cursor = page_args()
+        pager = get_blogs_page(app.config['ADMIN_PER_PAGE'], cursor, page)
+        return render_template('admin_blogs.html', posts=pager['items'], pager=pager)
 
 
 
@@ -257,13 +414,62 @@ def create_app():
             flash('Blog deleted.', 'info')
         return redirect(url_for('admin_blogs'))
 
+    def back_to_listing(endpoint):
+        # the page the bulk form was submitted from (None values are dropped)
+        return redirect(url_for(endpoint, page=request.form.get('page', type=int),
+                                cursor=request.form.get('cursor') or None))
+
+    def flash_bulk(rows, done, failed):
+        if rows is None:
+            flash(f'{failed} — check logs.', 'warning')
+        else:
+            flash(done.format(n=len(rows)), 'info')
+
+    @app.route('/admin/products/bulk', methods=['POST'])
+    @admin_required
+    def admin_products_bulk():
+        ids = request.form.getlist('ids', type=int)
+        action = request.form.get('action')
+        value = request.form.get('value', type=float)
+        if not ids:
+            flash('Select at least one product first.', 'warning')
+        elif action == 'delete':
+            flash_bulk(delete_products(ids), '{n} products deleted.', 'Could not delete products')
+        elif action in ('set_price', 'adjust_price') and value is None:
+            flash('Enter a price or a percentage.', 'warning')
+        elif action == 'set_price':
+            flash_bulk(update_products(ids, {'price': max(0.0, value)}),
+                       '{n} products now cost $%.2f.' % max(0.0, value), 'Could not update prices')
+        elif action == 'adjust_price':
+            flash_bulk(adjust_product_prices(ids, value),
+                       '{n} prices changed by %+g%%.' % value, 'Could not update prices')
+        else:
+            flash('Choose a bulk action.', 'warning')
+        return back_to_listing('admin_products')
+
+    @app.route('/admin/blogs/bulk', methods=['POST'])
+    @admin_required
+    def admin_blogs_bulk():
+        ids = request.form.getlist('ids', type=int)
+        action = request.form.get('action')
+        if not ids:
+            flash('Select at least one blog first.', 'warning')
+        elif action == 'delete':
+            flash_bulk(delete_blogs(ids), '{n} blogs deleted.', 'Could not delete blogs')
+        elif action == 'republish':
+            flash_bulk(republish_blogs(ids), '{n} blogs republished.', 'Could not republish blogs')
+        else:
+            flash('Choose a bulk action.', 'warning')
+        return back_to_listing('admin_blogs')
+
     @app.route('/admin/edit/<key>', methods=['GET', 'POST'])
     @admin_required
     def admin_edit(key):
         if request.method == 'POST':
             val = request.form.get('value', '')
 
-            ok = update_site_content(key, val)
+            # one upsert: a key the seed never created is inserted, not patched
+            ok = save_site_contents({key: val})
             if not ok:
                 flash('Could not update content — check logs.', 'warning')
             else:
@@ -272,10 +478,29 @@ def create_app():
             return redirect(url_for('admin_dashboard'))
 
     # GET existing value exactly as stored
-        val = get_site_content(key) or ''
+        val = get_site_contents([key]).get(key)
+        if val is None:
+            val = DEFAULT_SITE_CONTENT.get(key, '')
         return render_template('admin_edit.html', item={'key': key, 'value': val})
 
 
+    @app.route('/admin/cache')
+    @admin_required
+    def admin_cache_stats():
+        return jsonify(cache_stats())
+
+    @app.route('/admin/mail')
+    @admin_required
+    def admin_mail_stats():
+        return jsonify(mail_queue.stats())
+
+    @app.route('/admin/replica')
+    @admin_required
+    def admin_replica_stats():
+        if local_replica is None:
+            return jsonify({'enabled': False})
+        return jsonify({'enabled': True, **local_replica.stats()})
+
     @app.errorhandler(404)
     def not_found(e):
         return render_template('404.html'), 404
@@ -0,0 +1,171 @@
+"""Fingerprinted, precompressed static assets.
+
+Build step (run before deploying; vercel.json's buildCommand runs it)::
+
+    python assets.py
+
+writes the hoisted component styles (components.py), then copies every
+file under ``static/`` to ``static/dist/`` with a content hash
+in its name (``css/main.css`` -> ``css/main.3f9a1c2b7d4e.css``), writes
+``.gz``/``.br`` siblings for text assets and fonts, and records everything
+in ``static/dist/manifest.json``.
+
+At runtime ``init_app`` loads the manifest once. ``url_for('static', ...)``
+is rewritten to the hashed name with a dict lookup. Hashed files are
+served with ``Cache-Control: immutable``, a strong ETag, and the best
+encoding the client accepts. Without a manifest everything falls back to
+Flask's normal static handling.
+
+On Vercel the build also copies ``static/dist/`` to ``public/static/dist/``,
+so the CDN serves the hashed files (compressing them itself) with the
+immutable header from vercel.json, and the function never sees them.
+Behind gunicorn, let nginx do the same::
+
+    location /static/dist/ {
+        alias /srv/app/static/dist/;
+        gzip_static on;               # brotli_static on; with ngx_brotli
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are still built
+    brotli = None
+
+DIST = "dist"
+MANIFEST = "manifest.json"
+COMPRESSIBLE = {".css", ".js", ".svg", ".ttf", ".otf", ".eot", ".json", ".txt", ".map", ".xml"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+# ---------- BUILD ----------
+def _digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()[:12]
+
+
+def _place(src, dst):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.exists(dst):
+        return
+    try:
+        os.link(src, dst)       # same bytes, no second copy of the video
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _precompress(path):
+    """Write smaller .br/.gz siblings of ``path``; return the encodings kept."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    encodings = []
+    candidates = []
+    if brotli is not None:
+        candidates.append(("br", ".br", lambda: brotli.compress(raw, quality=11)))
+    candidates.append(("gzip", ".gz", lambda: gzip.compress(raw, compresslevel=9, mtime=0)))
+    for name, suffix, compress in candidates:
+        data = compress()
+        if len(data) < len(raw):
+            with open(path + suffix, "wb") as f:
+                f.write(data)
+            encodings.append(name)
+    return encodings
+
+
+def build(static_folder):
+    """Fingerprint everything under ``static_folder`` into ``static_folder/dist``."""
+    dist = os.path.join(static_folder, DIST)
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.abspath(root) == os.path.abspath(static_folder):
+            dirs[:] = [d for d in dirs if d != DIST]
+        for name in files:
+            src = os.path.join(root, name)
+            rel = os.path.relpath(src, static_folder).replace(os.sep, "/")
+            digest = _digest(src)
+            stem, ext = os.path.splitext(rel)
+            hashed = f"{stem}.{digest}{ext}"
+            dst = os.path.join(dist, hashed)
+            _place(src, dst)
+            encodings = _precompress(dst) if ext.lower() in COMPRESSIBLE else []
+            manifest[rel] = {"file": f"{DIST}/{hashed}", "hash": digest, "encodings": encodings}
+    with open(os.path.join(dist, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+# ---------- RUNTIME ----------
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def init_app(app):
+    manifest = load_manifest(app.static_folder)
+    app.extensions["assets"] = manifest
+    if not manifest:
+        return
+    hashed = {entry["file"]: entry for entry in manifest.values()}
+    default_static = app.view_functions["static"]
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        if endpoint == "static":
+            entry = manifest.get(values.get("filename"))
+            if entry is not None:
+                values["filename"] = entry["file"]
+
+    def static(filename):
+        entry = hashed.get(filename)
+        if entry is None:
+            return default_static(filename=filename)
+        encoding = _negotiate(entry["encodings"])
+        suffix = {"br": ".br", "gzip": ".gz"}.get(encoding, "")
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        etag = entry["hash"] + (f"-{encoding}" if encoding else "")
+        resp = send_from_directory(app.static_folder, filename + suffix, mimetype=mimetype, etag=etag)
+        resp.headers.pop("Content-Disposition", None)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        if entry["encodings"]:
+            resp.vary.add("Accept-Encoding")
+        resp.headers["Cache-Control"] = IMMUTABLE
+        return resp
+
+    app.view_functions["static"] = static
+
+
+def _negotiate(available):
+    if not available:
+        return None
+    accepted = request.accept_encodings
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted[encoding] > 0:
+            return encoding
+    return None
+
+
+if __name__ == "__main__":
+    import components
+    here = os.path.dirname(os.path.abspath(__file__))
+    # generated into static/ first, so it is fingerprinted with the rest
+    if components.write_stylesheet(os.path.join(here, "templates"), os.path.join(here, "static")) is None:
+        print(f"⚠️ Could not write static/{components.CSS_FILE}; component styles stay inline")
+    result = build(os.path.join(here, "static"))
+    compressed = sum(1 for e in result.values() if e["encodings"])
+    print(f"✅ Fingerprinted {len(result)} static files ({compressed} precompressed)")
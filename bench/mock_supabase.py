@@ -0,0 +1,374 @@
+"""Local stand-in for the Supabase REST (PostgREST) and Storage endpoints.
+
+    python bench/mock_supabase.py --port 54321 --products 5000 --blogs 500 --latency 40 --jitter 15
+
+Covers what supabase_db uses: select/order/limit/offset, Range and
+``Prefer: count=exact`` (Content-Range totals), eq/neq/lt/lte/gt/gte/in/is
+filters, ``or=(..., and(...))`` keyset filters, bulk inserts with
+``columns=``, ``on_conflict`` with ignore/merge duplicates,
+``return=representation``, PATCH and DELETE. Like the tables after
+migrations/002_replica_sync.sql, rows carry ``updated_at`` and deletes
+leave tombstones in ``deleted_rows``. Storage covers object upload
+(``x-upsert``), HEAD/GET of public objects, list and bulk delete.
+
+Every request sleeps ``latency ± jitter`` milliseconds first to model the
+WAN round trip. The dataset is generated from ``--seed``, so two runs with
+the same arguments serve identical data.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+WORDS = ("amber vanilla lavender cedar rose jasmine sandalwood citrus smoky honey winter autumn "
+         "golden royal soy beeswax wick flame glow calm cozy evening garden spice musk linen ocean "
+         "fig pine cinnamon clove orchid velvet midnight dawn ember hearth").split()
+
+
+class Store:
+    """Tables, storage objects and counters behind one lock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tables = {"products": [], "blog_posts": [], "site_content": [], "deleted_rows": []}
+        self.objects = {}
+        self.next_id = {}
+        self.clock = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.requests = 0
+
+    def now(self):
+        # strictly increasing, like distinct commit timestamps
+        self.clock = max(self.clock + timedelta(microseconds=1), datetime.now(timezone.utc))
+        return self.clock.isoformat()
+
+    def insert(self, table, row):
+        self.next_id[table] = self.next_id.get(table, 0) + 1
+        stamp = self.now()
+        row = {"id": self.next_id[table], "created_at": stamp, **row, "updated_at": stamp}
+        self.tables.setdefault(table, []).append(row)
+        return row
+
+    def seed(self, products, blogs, seed):
+        rng = random.Random(seed)
+
+        def words(n):
+            return " ".join(rng.choice(WORDS) for _ in range(n))
+
+        for i in range(products):
+            self.insert("products", {
+                "name": f"{words(2).title()} Candle {i + 1}", "short_desc": words(12),
+                "price": round(rng.uniform(8, 60), 2), "image": None, "image_variants": None,
+            })
+        for i in range(blogs):
+            paragraphs = "\n\n".join(words(60) for _ in range(5))
+            self.insert("blog_posts", {
+                "title": words(4).title(), "excerpt": words(25), "content": paragraphs,
+                "image": None, "image_variants": None,
+            })
+        for key, value in (("about", "Handcrafted candles. " + words(30)),
+                           ("special_offer", "Limited-time: " + words(8))):
+            self.insert("site_content", {"key": key, "value": value})
+
+
+# ---------- POSTGREST QUERY SEMANTICS ----------
+def _value(raw):
+    raw = unquote(raw).strip('"')
+    for cast in (int, float):
+        try:
+            return cast(raw)
+        except ValueError:
+            pass
+    return raw
+
+
+def _compare(row, column, op, raw):
+    have = row.get(column)
+    if op == "is":
+        return have is None if raw == "null" else have is not None
+    if op == "in":
+        inner = unquote(raw).strip("()")
+        wanted = [_value(v) for v in _split(inner)] if inner else []
+        return have in wanted or str(have) in {str(w) for w in wanted}
+    want = _value(raw)
+    if have is None:
+        return False
+    if isinstance(have, str) or isinstance(want, str):
+        have, want = str(have), str(want)
+    return {"eq": have == want, "neq": have != want, "lt": have < want, "lte": have <= want,
+            "gt": have > want, "gte": have >= want}[op]
+
+
+def _split(expr):
+    """Split on top-level commas (outside parentheses and quotes)."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for ch in expr:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+    parts.append(current)
+    return parts
+
+
+def _logic(expr, combine):
+    preds = []
+    for part in _split(expr[1:-1]):
+        if part.startswith("and("):
+            preds.append(_logic(part[3:], all))
+        elif part.startswith("or("):
+            preds.append(_logic(part[2:], any))
+        else:
+            column, op, raw = part.split(".", 2)
+            preds.append(lambda r, c=column, o=op, v=raw: _compare(r, c, o, v))
+    return lambda r: combine(p(r) for p in preds)
+
+
+def _sort(rows, order):
+    for part in reversed(order.split(",")):
+        column, *mods = part.split(".")
+        rows.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse="desc" in mods)
+
+
+def _answer(status, body=b"", headers=None):
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode()
+    return status, body, headers
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out as two writes; with Nagle on, keep-alive
+    # clients wait ~40 ms for the delayed ACK between them
+    disable_nagle_algorithm = True
+    store = None
+    latency = 0.0
+    jitter = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body, headers):
+        self.send_response(status)
+        headers = {"Content-Type": "application/json", **(headers or {})}
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _body(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            data = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return data
+                data += self.rfile.read(size)
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        body = self._body()
+        if url.path == "/_stats":   # harness bookkeeping: no latency, not counted
+            with self.store.lock:
+                answer = _answer(200, {"requests": self.store.requests,
+                                       "rows": {t: len(r) for t, r in self.store.tables.items()},
+                                       "objects": len(self.store.objects)})
+            return self._reply(*answer)
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        with self.store.lock:       # the reply is written after the lock is released
+            self.store.requests += 1
+            if url.path.startswith("/rest/v1/"):
+                answer = self.rest(url.path[len("/rest/v1/"):], parse_qsl(url.query, keep_blank_values=True), body)
+            elif url.path.startswith("/storage/v1/"):
+                answer = self.storage(url.path[len("/storage/v1/"):], body)
+            else:
+                answer = _answer(404, {"message": "not found"})
+        self._reply(*answer)
+
+    do_GET = do_HEAD = do_POST = do_PATCH = do_DELETE = _handle
+
+    # ---------- REST ----------
+    def rest(self, table, params, body):
+        if table not in self.store.tables:
+            return _answer(404, {"message": f'relation "public.{table}" does not exist'})
+        rows = self.store.tables[table]
+        select, order, limit, offset, columns, on_conflict = "*", None, None, 0, None, None
+        preds = []
+        for key, value in params:
+            if key == "select":
+                select = value
+            elif key == "order":
+                order = value
+            elif key == "limit":
+                limit = int(value)
+            elif key == "offset":
+                offset = int(value)
+            elif key == "columns":
+                columns = value.split(",")
+            elif key == "on_conflict":
+                on_conflict = value
+            elif key in ("or", "and"):
+                preds.append(_logic(value, any if key == "or" else all))
+            else:
+                op, raw = value.split(".", 1)
+                preds.append(lambda r, c=key, o=op, v=raw: _compare(r, c, o, v))
+        prefer = self.headers.get("Prefer", "")
+        matched = [r for r in rows if all(p(r) for p in preds)]
+
+        if self.command in ("GET", "HEAD"):
+            if order:
+                _sort(matched, order)
+            total = len(matched)
+            partial = False
+            if self.headers.get("Range"):
+                first, last = self.headers["Range"].split("-")
+                offset, limit = int(first), int(last) - int(first) + 1
+                if offset > 0 and offset >= total:
+                    return _answer(416, {"message": "Requested range not satisfiable"},
+                                       {"Content-Range": f"*/{total}"})
+            page = matched[offset:offset + limit if limit is not None else None]
+            partial = len(page) < total
+            if select != "*":
+                wanted = select.split(",")
+                page = [{c: r.get(c) for c in wanted} for r in page]
+            span = f"{offset}-{offset + len(page) - 1}" if page else "*"
+            counted = "count=exact" in prefer
+            headers = {"Content-Range": f"{span}/{total if counted else '*'}"}
+            return _answer(206 if partial and counted else 200, page, headers)
+
+        if self.command == "POST":
+            items = json.loads(body or b"null")
+            items = items if isinstance(items, list) else [items]
+            created = []
+            for item in items:
+                if columns:
+                    item = {c: item.get(c) for c in columns}
+                if on_conflict or "resolution=" in prefer:
+                    key = on_conflict or "id"
+                    existing = next((r for r in rows if key in item and r.get(key) == item[key]), None)
+                    if existing is not None:
+                        if "merge-duplicates" in prefer:
+                            existing.update(item, updated_at=self.store.now())
+                            created.append(existing)
+                        elif "ignore-duplicates" not in prefer:
+                            return _answer(409, {"message": "duplicate key value violates unique constraint"})
+                        continue
+                elif table == "site_content" and any(r["key"] == item.get("key") for r in rows):
+                    return _answer(409, {"message": "duplicate key value violates unique constraint"})
+                created.append(self.store.insert(table, item))
+            if "return=representation" in prefer:
+                return _answer(201, created)
+            return _answer(201)
+
+        if self.command == "PATCH":
+            fields = json.loads(body or b"{}")
+            for row in matched:
+                row.update(fields, updated_at=self.store.now())
+            if "return=representation" in prefer:
+                return _answer(200, matched)
+            return _answer(204)
+
+        if self.command == "DELETE":
+            ids = {id(r) for r in matched}
+            self.store.tables[table] = [r for r in rows if id(r) not in ids]
+            for row in matched:
+                self.store.tables["deleted_rows"].append({
+                    "id": len(self.store.tables["deleted_rows"]) + 1, "table_name": table,
+                    "row_id": row["id"], "deleted_at": self.store.now()})
+            if "return=representation" in prefer:
+                return _answer(200, matched)
+            return _answer(204)
+        return _answer(405, {"message": "method not allowed"})
+
+    # ---------- STORAGE ----------
+    def storage(self, path, body):
+        objects = self.store.objects
+        if path.startswith("object/list/"):
+            bucket = path[len("object/list/"):]
+            req = json.loads(body or b"{}")
+            prefix = req.get("prefix", "").strip("/")
+            names = sorted(k[len(bucket) + len(prefix) + 2:] for k in objects
+                           if k.startswith(f"{bucket}/{prefix}/"))
+            start, count = req.get("offset", 0), req.get("limit", 100)
+            return _answer(200, [{"name": n, "id": n, "metadata": {"size": len(objects[f"{bucket}/{prefix}/{n}"][0])}}
+                                     for n in names[start:start + count]])
+        if path.startswith("object/public/"):
+            key = path[len("object/public/"):]
+            if key in objects:
+                data, content_type = objects[key]
+                return _answer(200, data, {"Content-Type": content_type})
+            return _answer(400, {"statusCode": "404", "error": "not_found", "message": "Object not found"})
+        if path.startswith("object/") and self.command == "DELETE" and path.count("/") == 1:
+            bucket = path.split("/", 1)[1]
+            removed = []
+            for name in json.loads(body or b"{}").get("prefixes", []):
+                if objects.pop(f"{bucket}/{name}", None) is not None:
+                    removed.append({"name": name})
+            return _answer(200, removed)
+        if path.startswith("object/"):
+            key = path[len("object/"):]
+            if self.command == "POST":
+                if key in objects and self.headers.get("x-upsert") != "true":
+                    return _answer(409, {"statusCode": "409", "error": "Duplicate",
+                                             "message": "The resource already exists"})
+                objects[key] = (body, self.headers.get("Content-Type", "application/octet-stream"))
+                return _answer(200, {"Key": key})
+            if self.command in ("GET", "HEAD") and key in objects:
+                data, content_type = objects[key]
+                return _answer(200, data, {"Content-Type": content_type})
+            return _answer(400, {"statusCode": "404", "error": "not_found", "message": "Object not found"})
+        return _answer(404, {"message": "not found"})
+
+
+def serve(host="127.0.0.1", port=0, products=1000, blogs=100, latency_ms=0, jitter_ms=0, seed=1):
+    """Start the mock on a background thread; return the server (``server_port`` is the port)."""
+    store = Store()
+    store.seed(products, blogs, seed)
+    handler = type("MockHandler", (Handler,), {
+        "store": store, "latency": latency_ms / 1000, "jitter": jitter_ms / 1000})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.store = store
+    threading.Thread(target=server.serve_forever, name="mock-supabase", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--blogs", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0, help="added delay per request, ms")
+    parser.add_argument("--jitter", type=float, default=0, help="± random part of the delay, ms")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    server = serve(args.host, args.port, args.products, args.blogs, args.latency, args.jitter, args.seed)
+    print(f"🔹 Mock Supabase on http://{args.host}:{server.server_port} "
+          f"({args.products} products, {args.blogs} posts, {args.latency}±{args.jitter} ms)", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
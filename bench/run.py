@@ -0,0 +1,404 @@
+"""Load-test every public and admin route against the local Supabase mock.
+
+    python bench/run.py
+    python bench/run.py --requests 300 --concurrency 16 --latency 40 --jitter 10 --products 5000
+    python bench/run.py --env REPLICA_ENABLED=True --compare bench/results/<baseline>.json
+
+Starts bench/mock_supabase.py and the app (Werkzeug's threaded server, or
+gunicorn with ``--server gunicorn``) as subprocesses, so neither shares a
+GIL with the load generator. For each route it then sends ``--requests``
+requests from ``--concurrency`` client threads (after ``--warmup``
+unrecorded ones) and reports:
+- throughput
+- p50/p95/p99 latency
+- errors
+- Supabase round trips per request, counted by the mock
+
+Results go to bench/results/<time>-<commit>.json together with the
+arguments, so runs on two commits can be compared with ``--compare``.
+``--max-regression`` exits non-zero when a route's p95 grew by more than
+that many percent.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.security import generate_password_hash
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+RESULTS = os.path.join(HERE, "results")
+ADMIN_PASSWORD = "bench-admin"
+QUERIES = ("amber", "lav", "vanilla candle", "winter glow", "ced", "rose jasmine", "smoky", "zzz")
+
+
+class Route:
+    def __init__(self, name, path, method="GET", data=None, files=None, admin=False):
+        self.name = name
+        self.path = path            # str, or callable(ctx) -> str
+        self.method = method
+        self.data = data            # dict, or callable(ctx) -> dict
+        self.files = files          # callable(ctx) -> dict
+        self.admin = admin
+
+    def build(self, ctx):
+        path = self.path(ctx) if callable(self.path) else self.path
+        data = self.data(ctx) if callable(self.data) else self.data
+        files = self.files(ctx) if self.files else None
+        return path, data, files
+
+
+def _png(ctx):
+    from PIL import Image
+    out = io.BytesIO()
+    Image.new("RGB", (900, 600), (ctx.rand(0, 255), 120, 40)).save(out, "PNG")
+    return {"image": ("bench.png", out.getvalue(), "image/png")}
+
+
+def _manifest(ctx):
+    rows = "\n".join(f"Imported Candle {ctx.rand(0, 10 ** 9)},bench import,9.5," for _ in range(20))
+    return {"manifest": ("products.csv", ("name,short_desc,price,image\n" + rows).encode(), "text/csv")}
+
+
+ROUTES = [
+    Route("home", "/"),
+    Route("about", "/about"),
+    Route("catalog", "/catalog"),
+    Route("catalog_page", lambda c: f"/catalog?page={c.rand(2, c.product_pages)}"),
+    Route("blog", "/blog"),
+    Route("blog_post", lambda c: f"/blog/{c.pick(c.blog_ids)}"),
+    Route("product_api", lambda c: f"/product/{c.pick(c.product_ids)}"),
+    Route("search", lambda c: f"/search?q={c.pick(QUERIES)}"),
+    Route("search_json", lambda c: f"/search?q={c.pick(QUERIES)}&format=json"),
+    Route("contact", "/contact"),
+    Route("contact_submit", "/contact", "POST",
+          lambda c: {"name": "Bench", "email": "bench@example.com", "message": f"Hello {c.rand(0, 10 ** 6)}"}),
+    Route("static_css", "/static/css/main.css"),
+    Route("admin_login_page", "/admin/login"),
+    Route("admin_dashboard", "/admin", admin=True),
+    Route("admin_products", "/admin/products", admin=True),
+    Route("admin_products_page", lambda c: f"/admin/products?page={c.rand(1, c.admin_pages)}", admin=True),
+    Route("admin_blogs", "/admin/blogs", admin=True),
+    Route("admin_edit", "/admin/edit/about", admin=True),
+    Route("admin_edit_save", "/admin/edit/special_offer", "POST",
+          lambda c: {"value": f"Limited-time offer {c.rand(0, 10 ** 6)}"}, admin=True),
+    Route("admin_product_add", "/admin/products", "POST",
+          lambda c: {"name": f"Bench Candle {c.rand(0, 10 ** 6)}", "short_desc": "bench", "price": "12.5"}, admin=True),
+    Route("admin_product_add_image", "/admin/products", "POST",
+          {"name": "Bench Image Candle", "short_desc": "bench", "price": "15"}, files=_png, admin=True),
+    Route("admin_blog_add", "/admin/blogs", "POST",
+          lambda c: {"title": f"Bench Post {c.rand(0, 10 ** 6)}", "excerpt": "bench",
+                     "content": "Benchmark post body. " * 40}, admin=True),
+    Route("admin_products_import", "/admin/products/import", "POST", files=_manifest, admin=True),
+    Route("admin_product_delete", lambda c: f"/admin/products/delete/{c.take('product')}", "POST", admin=True),
+    Route("admin_blog_delete", lambda c: f"/admin/blogs/delete/{c.take('blog')}", "POST", admin=True),
+    Route("admin_cache", "/admin/cache", admin=True),
+    Route("admin_mail", "/admin/mail", admin=True),
+    Route("admin_replica", "/admin/replica", admin=True),
+]
+
+
+class Context:
+    """Ids and page counts from the mock dataset; thread-safe random picks."""
+
+    def __init__(self, mock_url, seed, per_page=24, admin_per_page=50):
+        rows = requests.get(f"{mock_url}/rest/v1/products?select=id&order=id.asc", timeout=30).json()
+        self.product_ids = [r["id"] for r in rows] or [1]
+        rows = requests.get(f"{mock_url}/rest/v1/blog_posts?select=id&order=id.asc", timeout=30).json()
+        self.blog_ids = [r["id"] for r in rows] or [1]
+        self.product_pages = max(2, -(-len(self.product_ids) // per_page))
+        self.admin_pages = max(1, -(-len(self.product_ids) // admin_per_page))
+        # delete routes consume ids from the end so reads keep hitting live rows
+        self._deletable = {"product": list(self.product_ids[len(self.product_ids) // 2:]),
+                           "blog": list(self.blog_ids[len(self.blog_ids) // 2:])}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def rand(self, low, high):
+        with self._lock:
+            return self._rng.randint(low, high)
+
+    def pick(self, seq):
+        with self._lock:
+            return self._rng.choice(seq)
+
+    def take(self, kind):
+        with self._lock:
+            pool = self._deletable[kind]
+            return pool.pop() if pool else 0
+
+
+# ---------- PROCESSES ----------
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait(url, proc, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{url} exited with {proc.returncode}")
+        try:
+            requests.get(url, timeout=2)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up in {timeout}s")
+
+
+def start_mock(args, port, log):
+    cmd = [sys.executable, os.path.join(HERE, "mock_supabase.py"), "--port", str(port),
+           "--products", str(args.products), "--blogs", str(args.blogs),
+           "--latency", str(args.latency), "--jitter", str(args.jitter), "--seed", str(args.seed)]
+    proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+    _wait(f"http://127.0.0.1:{port}/_stats", proc)
+    return proc
+
+
+def start_app(args, port, mock_url, workdir, log):
+    env = {
+        **os.environ,
+        "SUPABASE_URL": mock_url,
+        "SUPABASE_KEY": "bench",
+        "SECRET_KEY": "bench",
+        # cheap hash: the benchmark measures the routes, not one login
+        "ADMIN_PASSWORD_HASH": generate_password_hash(ADMIN_PASSWORD, "pbkdf2:sha256:1000"),
+        # every client comes from 127.0.0.1; keep the login throttle out of the way
+        "LOGIN_RATE_PER_MIN": "100000",
+        "LOGIN_BURST": "1000",
+        "LOGIN_GLOBAL_RATE_PER_MIN": "100000",
+        "LOGIN_GLOBAL_BURST": "1000",
+        "MAIL_SUPPRESS_SEND": "True",
+        "MAIL_SPOOL_DIR": os.path.join(workdir, "mail_spool"),
+        "REPLICA_PATH": os.path.join(workdir, "replica.sqlite"),
+        "PYTHONUNBUFFERED": "1",
+    }
+    env.update(dict(pair.split("=", 1) for pair in args.env))
+    if args.server == "gunicorn":
+        cmd = ["gunicorn", "-w", str(args.workers), "--threads", str(args.threads),
+               "-b", f"127.0.0.1:{port}", "app:app"]
+    else:
+        cmd = [sys.executable, "-c",
+               "import app, werkzeug.serving as s; "
+               f"s.run_simple('127.0.0.1', {port}, app.app, threaded=True)"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    _wait(f"http://127.0.0.1:{port}/about", proc)
+    return proc
+
+
+# ---------- LOAD ----------
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def run_route(route, base, ctx, sessions, count, concurrency):
+    latencies, statuses, errors = [], {}, 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        session = sessions.get(route.admin)
+        path, data, files = route.build(ctx)
+        started = time.perf_counter()
+        try:
+            r = session.request(route.method, base + path, data=data, files=files,
+                                allow_redirects=False, timeout=60)
+            elapsed = time.perf_counter() - started
+            key, failed = str(r.status_code), r.status_code >= 400
+        except requests.RequestException as e:
+            elapsed, key, failed = time.perf_counter() - started, type(e).__name__, True
+        with lock:
+            latencies.append(elapsed * 1000)
+            statuses[key] = statuses.get(key, 0) + 1
+            errors += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(count)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": count,
+        "errors": errors,
+        "statuses": statuses,
+        "seconds": round(wall, 3),
+        "rps": round(count / wall, 1) if wall else None,
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2),
+    }
+
+
+class Sessions:
+    """One requests.Session per client thread; admin ones share a single login."""
+
+    def __init__(self, base):
+        self.base = base
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.admin_cookies = None
+
+    def get(self, admin):
+        name = "admin" if admin else "public"
+        session = getattr(self.local, name, None)
+        if session is None:
+            session = requests.Session()
+            if admin:
+                session.cookies.update(self._login())
+            setattr(self.local, name, session)
+        return session
+
+    def _login(self):
+        with self.lock:
+            if self.admin_cookies is None:
+                r = requests.post(f"{self.base}/admin/login", data={"password": ADMIN_PASSWORD},
+                                  allow_redirects=False, timeout=60)
+                if r.status_code != 302:
+                    raise RuntimeError(f"admin login failed: {r.status_code}")
+                self.admin_cookies = r.cookies
+            return self.admin_cookies
+
+
+def mock_requests(mock_url):
+    return requests.get(f"{mock_url}/_stats", timeout=10).json()["requests"]
+
+
+# ---------- REPORT ----------
+def git_commit():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD"], cwd=ROOT) != 0
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_table(results):
+    print(f"{'route':26} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'err':>5} {'sb/req':>7}")
+    for name, r in results.items():
+        print(f"{name:26} {r['rps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} "
+              f"{r['errors']:>5} {r['backend_per_request']:>7}")
+
+
+def compare(results, baseline_path, max_regression):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline['meta']['commit']} ({os.path.basename(baseline_path)}):")
+    print(f"{'route':26} {'p50':>10} {'p95':>10} {'rps':>10}")
+    regressed = []
+
+    def delta(new, old):
+        return f"{(new - old) / old * 100:+.0f}%" if old else "n/a"
+
+    for name, r in results.items():
+        old = baseline["routes"].get(name)
+        if not old:
+            continue
+        print(f"{name:26} {delta(r['p50_ms'], old['p50_ms']):>10} {delta(r['p95_ms'], old['p95_ms']):>10} "
+              f"{delta(r['rps'], old['rps']):>10}")
+        if max_regression is not None and old["p95_ms"] and \
+                (r["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 > max_regression:
+            regressed.append(name)
+    if regressed:
+        print(f"❌ p95 regressed by more than {max_regression}% on: {', '.join(regressed)}")
+    return not regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="recorded requests per route")
+    parser.add_argument("--warmup", type=int, default=5, help="unrecorded requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--routes", help="comma-separated route names (default: all)")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--blogs", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=30, help="mock Supabase latency, ms")
+    parser.add_argument("--jitter", type=float, default=10, help="mock latency jitter, ms")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--server", choices=("werkzeug", "gunicorn"), default="werkzeug")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the app, e.g. REPLICA_ENABLED=True")
+    parser.add_argument("--out", help="result file (default: bench/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to diff against")
+    parser.add_argument("--max-regression", type=float, help="fail if a route's p95 grew more than this %%")
+    parser.add_argument("--verbose", action="store_true", help="show mock and app output")
+    args = parser.parse_args(argv)
+
+    routes = ROUTES
+    if args.routes:
+        wanted = set(args.routes.split(","))
+        routes = [r for r in ROUTES if r.name in wanted]
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    log = None if args.verbose else open(os.path.join(workdir, "servers.log"), "w")
+    mock_port, app_port = _free_port(), _free_port()
+    mock_url, base = f"http://127.0.0.1:{mock_port}", f"http://127.0.0.1:{app_port}"
+    procs = []
+    try:
+        procs.append(start_mock(args, mock_port, log))
+        procs.append(start_app(args, app_port, mock_url, workdir, log))
+        ctx = Context(mock_url, args.seed)
+        sessions = Sessions(base)
+        results = {}
+        print(f"🔹 {len(routes)} routes × {args.requests} requests, concurrency {args.concurrency}, "
+              f"Supabase mock {args.latency}±{args.jitter} ms, {args.products} products")
+        for route in routes:
+            if args.warmup:
+                run_route(route, base, ctx, sessions, args.warmup, min(args.warmup, args.concurrency))
+            before = mock_requests(mock_url)
+            result = run_route(route, base, ctx, sessions, args.requests, args.concurrency)
+            result["backend_per_request"] = round((mock_requests(mock_url) - before) / args.requests, 2)
+            results[route.name] = result
+            print(f"   {route.name:26} {result['rps']:>8} rps  p95 {result['p95_ms']} ms", flush=True)
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if log:
+            log.close()
+
+    meta = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "verbose")},
+    }
+    out = args.out or os.path.join(RESULTS, f"{time.strftime('%Y%m%d-%H%M%S')}-{meta['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"meta": meta, "routes": results}, f, indent=1)
+
+    print()
+    print_table(results)
+    print(f"\n✅ Saved {out}")
+    ok = compare(results, args.compare, args.max_regression) if args.compare else True
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Time search.py queries against a large in-memory index and enforce a budget.
+
+    python bench/search_bench.py
+    python bench/search_bench.py --products 40000 --blogs 10000 --budget 10 --runs 50
+
+Fills a SearchIndex with the rows bench/mock_supabase.py generates (every
+product name contains "Candle", so that word matches most of the index),
+then runs each query ``--runs`` times after one warmup. Prints the p50 and
+p95 per query and exits non-zero when any p95 is over ``--budget`` ms.
+No Supabase or network is involved.
+"""
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from mock_supabase import Store  # noqa: E402
+from run import percentile  # noqa: E402
+import search  # noqa: E402
+
+QUERIES = ("candle", "ca", "c", "vanilla candle", "amber rose garden", "honey", "glow",
+           "midnight ember hearth", "nothing-matches-this")
+
+
+def build(products, blogs, seed):
+    store = Store()
+    store.seed(products, blogs, seed)
+    index = search.SearchIndex()
+    conn = index._new_index()
+    for table in search.TABLE_KIND:
+        index._apply(conn, table, store.tables[table], None)
+        kind_table = search._table(search.TABLE_KIND[table])
+        conn.execute(f"INSERT INTO {kind_table} ({kind_table}) VALUES ('optimize')")
+    index._conn = conn
+    index.built_at = time.monotonic()
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=40000)
+    parser.add_argument("--blogs", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=50, help="timed searches per query")
+    parser.add_argument("--budget", type=float, default=10, help="max p95 per query, ms")
+    parser.add_argument("--queries", help="comma-separated queries (default: a built-in mix)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    index = build(args.products, args.blogs, args.seed)
+    print(f"🔹 Indexed {index.documents} documents in {time.perf_counter() - started:.1f} s")
+
+    ok = True
+    for query in args.queries.split(",") if args.queries else QUERIES:
+        index.search(query)
+        timings = []
+        for _ in range(args.runs):
+            t = time.perf_counter()
+            found = index.search(query)
+            timings.append((time.perf_counter() - t) * 1000)
+        timings.sort()
+        p95 = percentile(timings, 95)
+        over = p95 > args.budget
+        ok = ok and not over
+        print(f"   {'❌' if over else '✅'} {query!r:26} {len(found):>3} hits  "
+              f"p50 {percentile(timings, 50):6.2f} ms  p95 {p95:6.2f} ms")
+    if not ok:
+        print(f"❌ Over the {args.budget} ms budget")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import threading
+import time
+
+
+class CircuitBreaker:
+    """Stop calling a backend that keeps failing, and probe it to recover.
+
+    closed: every call goes through. ``failures`` failures in a row open
+    the circuit. While it is open, ``allow()`` says no for ``reset_after``
+    seconds, so callers fail fast (and serve what they have) instead of
+    waiting out timeouts. After that the circuit is half-open: one call at
+    a time goes through as a probe. A success closes the circuit; a failure
+    opens it again for another ``reset_after``.
+    """
+
+    def __init__(self, failures=5, reset_after=30.0):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.state = "closed"
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_after:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def success(self):
+        with self._lock:
+            self.state = "closed"
+            self._consecutive = 0
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self.state == "half_open" or (self.state == "closed" and self._consecutive >= self.failures):
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+                self.trips += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "open": int(self.state != "closed"),
+                "consecutive_failures": self._consecutive,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,218 @@
+"""Bulk catalog import: a CSV/JSON manifest plus an image directory or zip.
+
+    python bulk_import.py products.csv images/ [--report report.json]
+    python bulk_import.py products.json images.zip --workers 16 --batch-size 500
+
+The manifest has one product per row/object with ``name``, ``short_desc``,
+``price`` and ``image`` (a file name inside the image directory/zip, or an
+http(s) URL that is stored as is). Images are streamed to Supabase Storage
+with bounded parallelism (identical files upload once), then the rows are
+inserted with one array POST per batch. The admin endpoint
+``/admin/products/import`` runs the same code.
+"""
+import argparse
+import csv
+import io
+import json
+import mimetypes
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import IMPORT_BATCH_SIZE, IMPORT_UPLOAD_WORKERS
+from supabase_db import add_products, upload_stream_to_supabase_storage
+
+IMAGE_EXT = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+REQUIRED_COLUMNS = ('name',)
+
+
+# ---------- manifest ----------
+def read_manifest(fileobj, filename):
+    """Parse a CSV or JSON manifest into a list of dicts; ValueError if it isn't one."""
+    raw = fileobj.read()
+    text = raw.decode('utf-8-sig') if isinstance(raw, bytes) else raw
+    if filename.lower().endswith('.json'):
+        data = json.loads(text)
+        if isinstance(data, dict):
+            if 'products' not in data:
+                raise ValueError('expected a list of products or {"products": [...]}')
+            data = data['products']
+        if not isinstance(data, list) or not all(isinstance(entry, dict) for entry in data):
+            raise ValueError('expected a list of product objects')
+        return data
+    try:
+        reader = csv.DictReader(io.StringIO(text))
+        missing = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"missing column(s) {', '.join(missing)}")
+        return list(reader)
+    except csv.Error as e:
+        raise ValueError(str(e))
+
+
+def _clean(entry):
+    name = (entry.get('name') or '').strip()
+    if not name:
+        raise ValueError('missing name')
+    try:
+        price = float(entry.get('price') or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"bad price {entry.get('price')!r}")
+    return {'name': name, 'short_desc': (entry.get('short_desc') or '').strip() or None,
+            'price': price, 'image': (entry.get('image') or '').strip() or None}
+
+
+# ---------- image sources ----------
+class DirectorySource:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def opener(self, name):
+        path = os.path.abspath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            raise FileNotFoundError(f"{name} not found")
+        return (lambda: open(path, 'rb')), os.path.getsize(path)
+
+
+class ZipSource:
+    def __init__(self, file):
+        self.zip = zipfile.ZipFile(file)
+        # match on the base name too, so "img/a.jpg" is found as "a.jpg"
+        self.members = {}
+        for info in self.zip.infolist():
+            if not info.is_dir():
+                self.members.setdefault(info.filename, info)
+                self.members.setdefault(os.path.basename(info.filename), info)
+
+    def opener(self, name):
+        info = self.members.get(name) or self.members.get(os.path.basename(name))
+        if info is None:
+            raise FileNotFoundError(f"{name} not found")
+        return (lambda: self.zip.open(info)), info.file_size
+
+
+def open_source(images):
+    """Directory path, zip path or zip file object -> image source (or None).
+
+    Raises ValueError when ``images`` is not a readable zip.
+    """
+    if images is None:
+        return None
+    if isinstance(images, str) and os.path.isdir(images):
+        return DirectorySource(images)
+    try:
+        return ZipSource(images)
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, OSError) as e:
+        raise ValueError(f"not a readable zip: {e}")
+
+
+# ---------- import ----------
+def import_catalog(entries, source=None, batch_size=IMPORT_BATCH_SIZE,
+                   workers=IMPORT_UPLOAD_WORKERS, progress=None):
+    """Upload images and insert ``entries``; return one result dict per entry.
+
+    ``progress(phase, done, total)`` is called as uploads and inserts finish.
+    """
+    progress = progress or (lambda phase, done, total: None)
+    results = [{'line': i + 1, 'name': e.get('name'), 'status': 'pending'} for i, e in enumerate(entries)]
+    rows = {}
+    for i, entry in enumerate(entries):
+        try:
+            rows[i] = _clean(entry)
+        except ValueError as e:
+            results[i].update(status='error', error=str(e))
+
+    # 1. images: one upload per distinct file, bounded parallelism
+    wanted = {}
+    for i, row in rows.items():
+        ref = row['image']
+        if ref and not ref.startswith(('http://', 'https://')):
+            wanted.setdefault(ref, []).append(i)
+    uploaded = {}
+    if wanted:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import') as pool:
+            futures = {pool.submit(_upload, source, ref): ref for ref in wanted}
+            for done, future in enumerate(as_completed(futures), 1):
+                ref = futures[future]
+                try:
+                    uploaded[ref] = future.result()
+                except Exception as e:
+                    for i in wanted[ref]:
+                        results[i].update(status='error', error=f'image {ref}: {e}')
+                progress('images', done, len(wanted))
+    for ref, indexes in wanted.items():
+        for i in indexes:
+            if ref in uploaded:
+                rows[i]['image'] = uploaded[ref]
+
+    # 2. rows: one array POST per batch
+    ready = [i for i in rows if results[i]['status'] == 'pending']
+    for start in range(0, len(ready), batch_size):
+        batch = ready[start:start + batch_size]
+        created = add_products([rows[i] for i in batch])
+        if created is None or len(created) != len(batch):
+            for i in batch:
+                results[i].update(status='error', error='insert failed')
+        else:
+            # PostgREST returns inserted rows in request order
+            for i, row in zip(batch, created):
+                results[i].update(status='ok', id=row.get('id'), image=row.get('image'))
+        progress('rows', min(start + batch_size, len(ready)), len(ready))
+    return results
+
+
+def _upload(source, ref):
+    if source is None:
+        raise FileNotFoundError(f'{ref} (no image directory or zip given)')
+    if os.path.splitext(ref)[1].lower() not in IMAGE_EXT:
+        raise ValueError('not an image')
+    open_file, size = source.opener(ref)
+    content_type = mimetypes.guess_type(ref)[0] or 'application/octet-stream'
+    url = upload_stream_to_supabase_storage(open_file, ref, content_type, size)
+    if not url:
+        raise IOError('upload failed')
+    return url
+
+
+def summarize(results):
+    ok = sum(1 for r in results if r['status'] == 'ok')
+    return {'total': len(results), 'ok': ok, 'errors': len(results) - ok}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('manifest', help='CSV or JSON manifest')
+    parser.add_argument('images', nargs='?', help='image directory or .zip')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=IMPORT_UPLOAD_WORKERS)
+    parser.add_argument('--report', help='write per-row results to this JSON file')
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.manifest, 'rb') as f:
+            entries = read_manifest(f, args.manifest)
+        source = open_source(args.images)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    started = time.time()
+
+    def progress(phase, done, total):
+        print(f"\r🔹 {phase}: {done}/{total}", end='\n' if done == total else '', flush=True)
+
+    results = import_catalog(entries, source, args.batch_size, args.workers, progress)
+    for r in results:
+        if r['status'] != 'ok':
+            print(f"❌ line {r['line']} ({r['name']}): {r.get('error')}")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(results, f, indent=1)
+    summary = summarize(results)
+    print(f"✅ Imported {summary['ok']}/{summary['total']} products in {time.time() - started:.1f}s")
+    return 0 if summary['errors'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
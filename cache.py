@@ -0,0 +1,282 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+_MISSING = object()
+
+
+class TTLCache:
+    """Small in-process read-through cache.
+
+    Entries expire after ``ttl`` seconds and the least recently used entry is
+    evicted once ``max_entries`` is reached. Concurrent misses on the same key
+    share a single call to the loader (single-flight), so a cold cache under a
+    burst of traffic still only costs one Supabase round trip.
+
+    Keys are strings such as ``"products"`` or ``"products:page:1"``;
+    ``invalidate("products")`` drops the key and everything under it.
+    Cached values are shared between requests and must be treated as
+    read-only by callers.
+
+    With ``stale_ttl``, an expired entry is still answered for that many
+    seconds while one background call refreshes it (stale-while-revalidate).
+    When a load fails, the last value for the key is returned instead of
+    the error, however old. With ``snapshots`` (a DiskSnapshots), loaded
+    values are also written to disk, so a new process starts from them and
+    an outage with nothing in memory still has an answer.
+    """
+
+    def __init__(self, ttl=60, max_entries=256, stale_ttl=0, snapshots=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.snapshots = snapshots
+        self._data = OrderedDict()      # key -> (expires_at, value)
+        self._inflight = {}             # key -> _Flight
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._invalidated = {}          # prefix -> wall time of its last invalidate
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.fallbacks = 0
+        self.evictions = 0
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for ``key``, calling ``loader()`` on a miss.
+
+        Exceptions raised by the loader propagate to every waiting caller,
+        unless an older value can be served instead, and nothing is stored,
+        so failed fetches are never cached.
+        """
+        if self.snapshots is not None:
+            self._adopt_snapshot(key)
+        with self._lock:
+            now = time.monotonic()
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            flight = self._inflight.get(key)
+            if entry is not None and now < entry[0] + self.stale_ttl:
+                self.stale_hits += 1
+                if flight is None:
+                    flight = self._inflight[key] = _Flight()
+                    threading.Thread(target=self._refresh, args=(key, loader, flight, self._generation),
+                                     name="cache-refresh", daemon=True).start()
+                return entry[1]
+            self.misses += 1
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                generation = self._generation
+
+        try:
+            return self._load(key, loader, flight, generation) if leader else flight.wait()
+        except Exception:
+            value = self.stale(key, _MISSING)
+            if value is _MISSING:
+                raise
+            return value
+
+    def _load(self, key, loader, flight, generation):
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.fail(e)
+            raise
+
+        with self._lock:
+            self._inflight.pop(key, None)
+            # don't store a value fetched before an invalidation landed
+            stored = generation == self._generation
+            if stored:
+                self._store(key, value)
+        flight.resolve(value)
+        if stored:
+            self._save_snapshot(key, value)
+        return value
+
+    def _refresh(self, key, loader, flight, generation):
+        try:
+            self._load(key, loader, flight, generation)
+        except Exception as e:
+            log.warning("⚠️ Background refresh of %s failed, still serving the old value: %s", key, e)
+
+    def stale(self, key, default=None):
+        """The last value known for ``key`` at any age (memory, then disk), or ``default``."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self.fallbacks += 1
+                return entry[1]
+        snapshot = self.snapshots.load(key) if self.snapshots is not None else None
+        if snapshot is None:
+            return default
+        with self._lock:
+            self.fallbacks += 1
+        return snapshot[1]
+
+    def _adopt_snapshot(self, key):
+        # a key this process hasn't seen starts from its disk copy, unless
+        # it was invalidated here after that copy was written
+        with self._lock:
+            if key in self._data or not self.snapshots.wants(key):
+                return
+        snapshot = self.snapshots.load(key)
+        if snapshot is None:
+            return
+        saved_at, value = snapshot
+        with self._lock:
+            if key in self._data or saved_at <= self._invalidated_at(key):
+                return
+            age = max(0.0, time.time() - saved_at)
+            self._data[key] = (time.monotonic() + self.ttl - age, value)
+            self._trim()
+
+    def _invalidated_at(self, key):
+        return max((t for p, t in self._invalidated.items()
+                    if not p or key == p or key.startswith(p + ":")),
+                   default=0.0)
+
+    def _save_snapshot(self, key, value):
+        if self.snapshots is not None and self.snapshots.wants(key):
+            self.snapshots.save(key, value)
+
+    def peek(self, key, default=None):
+        """Return a fresh cached value without loading or touching stats."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+        return default
+
+    def fresh_items(self, prefix):
+        """[(key, value)] of every fresh entry whose key starts with ``prefix``."""
+        now = time.monotonic()
+        with self._lock:
+            return [(k, v) for k, (expires, v) in self._data.items() if k.startswith(prefix) and expires > now]
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+        self._save_snapshot(key, value)
+
+    def invalidate(self, *prefixes):
+        """Drop ``prefix`` and every ``prefix:...`` key for each prefix given."""
+        with self._lock:
+            self._generation += 1
+            now = time.time()
+            self._invalidated.update((p, now) for p in prefixes)
+            for key in list(self._data):
+                if any(key == p or key.startswith(p + ":") for p in prefixes):
+                    del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._invalidated[""] = time.time()     # "" prefixes every key
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "stale_hits": self.stale_hits,
+                "fallbacks": self.fallbacks,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }
+
+    def _store(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        self._trim()
+
+    def _trim(self):
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+
+class _Flight:
+    """A fetch in progress that other callers can wait on."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._value = None
+        self._error = None
+
+    def resolve(self, value):
+        self._value = value
+        self._event.set()
+
+    def fail(self, error):
+        self._error = error
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class DiskSnapshots:
+    """Last-known-good cache values as JSON files, one per key.
+
+    Every worker on the host reads and writes the same directory; files are
+    replaced atomically, so a reader sees the old or the new copy, never
+    half of one. ``wants(key)`` picks the keys worth keeping. Values that
+    can't be written (no disk, not JSON) are simply not kept.
+    """
+
+    def __init__(self, directory, wants=None):
+        self.directory = directory
+        self.wants = wants or (lambda key: True)
+        self.saved = 0
+        self.errors = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    def save(self, key, value):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump({"key": key, "saved_at": time.time(), "value": value}, f, separators=(",", ":"))
+            os.replace(tmp, path)
+            self.saved += 1
+        except (OSError, TypeError, ValueError) as e:
+            self.errors += 1
+            log.debug("🔹 Snapshot of %s not written: %s", key, e)
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def load(self, key):
+        """(saved_at, value) for ``key``, or None."""
+        try:
+            with open(self._path(key)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("key") != key:
+            return None
+        return data["saved_at"], data["value"]
@@ -0,0 +1,158 @@
+"""Cold-start helpers: a Jinja bytecode cache and an import-time report.
+
+    python coldstart.py                        # profile `import app` against the budget
+    python coldstart.py --compile-templates    # build step: fill JINJA_CACHE_DIR
+    python coldstart.py --runs 5 --top 20 --json coldstart.json
+
+Serverless workers (vercel.json) import the app on every cold start, so
+that import is kept cheap:
+- nothing at import time talks to Supabase
+- Pillow and Flask-Mail load on first use
+- templates load from compiled bytecode instead of being parsed and
+  compiled again
+
+The report runs ``python -X importtime -c "import app"`` in fresh
+interpreters. It prints the median wall time of the import and the
+slowest modules (what app pulls in, and the most expensive on their own).
+It exits non-zero when the median is over COLD_START_BUDGET_MS.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from jinja2 import FileSystemBytecodeCache
+
+from config import JINJA_CACHE_DIR, COLD_START_BUDGET_MS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROBE = "import time; t = time.perf_counter(); import app; print('COLDSTART', time.perf_counter() - t)"
+
+
+# ---------- TEMPLATES ----------
+class BytecodeCache(FileSystemBytecodeCache):
+    """A FileSystemBytecodeCache that never fails a render over an unwritable directory."""
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
+
+def _cache_dir():
+    # a directory shipped with the deploy is read even when it is read-only
+    if os.path.isdir(JINJA_CACHE_DIR):
+        return JINJA_CACHE_DIR
+    try:
+        os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+        return JINJA_CACHE_DIR
+    except OSError:
+        path = os.path.join(tempfile.gettempdir(), "jinja_cache")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+
+def init_app(app):
+    # must run before anything touches app.jinja_env
+    app.jinja_options = {**app.jinja_options, "bytecode_cache": BytecodeCache(_cache_dir())}
+
+
+def compile_templates(app):
+    """Load every template once so its bytecode lands in the cache; return the count."""
+    names = app.jinja_env.list_templates(extensions=["html"])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+# ---------- IMPORT PROFILE ----------
+def _parse_importtime(stderr):
+    """-X importtime lines -> [(module, self_us, cumulative_us, depth)] in output order."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def _app_subtree(entries):
+    # children are printed before their parent; app's run from the previous
+    # top-level entry up to app itself
+    end = next(i for i, e in enumerate(entries) if e[0] == "app" and e[3] == 0)
+    start = max((i for i in range(end) if entries[i][3] == 0), default=-1) + 1
+    return entries[start:end + 1]
+
+
+def profile(runs=3):
+    """Import the app in ``runs`` fresh interpreters; return (wall ms list, modules of the last run)."""
+    env = {**os.environ, "LOG_REQUESTS": "False"}
+    walls, modules = [], []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE],
+                             cwd=HERE, env=env, capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr[-2000:])
+        line = next(l for l in out.stdout.splitlines() if l.startswith("COLDSTART "))
+        walls.append(float(line.split()[1]) * 1000)
+        modules = _app_subtree(_parse_importtime(out.stderr))
+    return walls, modules
+
+
+def report(walls, modules, top=15, budget_ms=COLD_START_BUDGET_MS):
+    median = statistics.median(walls)
+    direct = sorted((m for m in modules if m[3] == 1), key=lambda m: -m[2])[:top]
+    heaviest = sorted(modules, key=lambda m: -m[1])[:top]
+    return {
+        "wall_ms": [round(w, 1) for w in walls],
+        "median_ms": round(median, 1),
+        "budget_ms": budget_ms,
+        "within_budget": median <= budget_ms,
+        "app_self_ms": round(next(m[1] for m in modules if m[0] == "app") / 1000, 1),
+        "imports": [{"module": m[0], "cumulative_ms": round(m[2] / 1000, 1)} for m in direct],
+        "self": [{"module": m[0], "self_ms": round(m[1] / 1000, 1)} for m in heaviest],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compile-templates", action="store_true", help="precompile templates and exit")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=COLD_START_BUDGET_MS)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    if args.compile_templates:
+        from app import app
+        count = compile_templates(app)
+        print(f"✅ Compiled {count} templates into {app.jinja_env.bytecode_cache.directory}")
+        return 0
+
+    result = report(*profile(args.runs), top=args.top, budget_ms=args.budget_ms)
+    print(f"🔹 import app: {result['median_ms']} ms median of {result['wall_ms']} "
+          f"(create_app and module body: {result['app_self_ms']} ms)")
+    print(f"\n{'imported by app':32} {'cumulative ms':>14}")
+    for m in result["imports"]:
+        print(f"{m['module']:32} {m['cumulative_ms']:>14}")
+    print(f"\n{'slowest modules':32} {'self ms':>14}")
+    for m in result["self"]:
+        print(f"{m['module']:32} {m['self_ms']:>14}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=1)
+    if not result["within_budget"]:
+        print(f"\n❌ Cold start {result['median_ms']} ms is over the {args.budget_ms:g} ms budget")
+        return 1
+    print(f"\n✅ Cold start within the {args.budget_ms:g} ms budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""Component styles in one stylesheet, and templates served minified.
+
+    python components.py       # write static/css/components.css (assets.py runs it first)
+
+Templates pulled in with ``{% include %}`` (product_card.html,
+pagination.html, ...) keep their CSS next to their markup. Rendered as is,
+that CSS is repeated once per include, so a 500-product catalog shipped
+500 copies of the card styles. Instead:
+- their ``<style>`` blocks are collected, deduped and written to
+  static/css/components.css, which base.html links after the page styles.
+  That keeps today's cascade, and assets.py fingerprints the file.
+- the template loader serves those templates without their ``<style>``
+  blocks, so a page grows only with its data.
+- every template is served with HTML comments and indentation removed,
+  and the CSS in ``<style>`` blocks squeezed. This happens once, when the
+  template is loaded, so it costs nothing per request. ``<pre>``,
+  ``<textarea>`` and ``<script>`` bodies are left as written.
+
+``init_app`` writes the stylesheet at startup when it is missing or out of
+date. If that fails (a read-only deploy without the build step), the
+component styles simply stay inline.
+"""
+import os
+import re
+import sys
+
+from jinja2 import BaseLoader
+
+from config import MINIFY_HTML
+
+CSS_FILE = "css/components.css"
+INCLUDE = re.compile(r"""{%-?\s*include\s+["']([^"']+)["']""")
+STYLE = re.compile(r"(<style\b[^>]*>)(.*?)</style>", re.S | re.I)
+# regions whose whitespace matters, or that are not HTML
+PROTECTED = re.compile(r"<(pre|textarea|script)\b.*?</\1\s*>|(<style\b[^>]*>)(.*?)</style\s*>", re.S | re.I)
+COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.S)
+QUOTED = re.compile(r"""("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')""")
+
+
+# ---------- MINIFY ----------
+def _squeeze_css(css):
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    return re.sub(r":\s+", ":", css).replace(";}", "}")
+
+
+def minify_css(css):
+    """Drop comments and spare whitespace; quoted strings are kept as written."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    parts = QUOTED.split(css)
+    return "".join(part if i % 2 else _squeeze_css(part) for i, part in enumerate(parts)).strip()
+
+
+def _trim_css(css):
+    # templated CSS: Jinja tags must survive, so only comments and indentation go
+    return re.sub(r"[ \t]*\n\s*", "\n", re.sub(r"/\*.*?\*/", "", css, flags=re.S)).strip()
+
+
+def _squeeze(markup):
+    markup = COMMENT.sub("", markup)
+    # indentation and blank lines go; a newline stays where there was one, so
+    # whitespace between inline elements still renders as a space
+    markup = re.sub(r"[ \t]*\n\s*", "\n", markup)
+    return re.sub(r"[ \t]{2,}", " ", markup)
+
+
+def minify_html(source):
+    """``source`` with comments and indentation removed outside pre/textarea/script."""
+    out, last = [], 0
+    for m in PROTECTED.finditer(source):
+        out.append(_squeeze(source[last:m.start()]))
+        if m.group(2):
+            css = m.group(3)
+            out.append(f"{m.group(2)}{minify_css(css) if _hoistable(css) else _trim_css(css)}</style>")
+        else:
+            out.append(m.group(0))
+        last = m.end()
+    out.append(_squeeze(source[last:]))
+    return "".join(out)
+
+
+# ---------- COMPONENT STYLES ----------
+def _read(folder, name):
+    with open(os.path.join(folder, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def find_components(template_folder):
+    """Names of the templates some other template includes."""
+    names = set()
+    for root, _, files in os.walk(template_folder):
+        for name in files:
+            if name.endswith(".html"):
+                names.update(INCLUDE.findall(_read(root, name)))
+    return sorted(n for n in names if os.path.isfile(os.path.join(template_folder, n)))
+
+
+def _hoistable(css):
+    # templated CSS (url_for etc.) has to be rendered, so it stays inline
+    return "{{" not in css and "{%" not in css
+
+
+def strip_styles(source):
+    return STYLE.sub(lambda m: "" if _hoistable(m.group(2)) else m.group(0), source)
+
+
+def stylesheet(template_folder, components):
+    """The deduped, minified CSS of every hoistable <style> block in ``components``."""
+    blocks, parts = set(), []
+    for name in components:
+        for _, css in STYLE.findall(_read(template_folder, name)):
+            css = minify_css(css)
+            if css and _hoistable(css) and css not in blocks:
+                blocks.add(css)
+                parts.append(f"/* {name} */\n{css}\n")
+    return "".join(parts)
+
+
+def write_stylesheet(template_folder, static_folder):
+    """Write components.css if it changed; return (components, css), or None if it can't be written."""
+    components = find_components(template_folder)
+    css = stylesheet(template_folder, components)
+    path = os.path.join(static_folder, CSS_FILE)
+    try:
+        with open(path, encoding="utf-8") as f:
+            if f.read() == css:
+                return components, css
+    except OSError:
+        pass
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(css)
+        os.replace(tmp, path)
+    except OSError:
+        return None
+    return components, css
+
+
+class ComponentLoader(BaseLoader):
+    """Serve templates minified, with the ``<style>`` blocks of ``components`` removed."""
+
+    def __init__(self, inner, components=(), minify=True):
+        self.inner = inner
+        self.components = frozenset(components)
+        self.minify = minify
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = self.inner.get_source(environment, template)
+        if template in self.components:
+            source = strip_styles(source)
+        if self.minify:
+            source = minify_html(source)
+        return source, filename, uptodate
+
+    def list_templates(self):
+        return self.inner.list_templates()
+
+
+def init_app(app, minify=MINIFY_HTML):
+    # must run before anything touches app.jinja_env
+    template_folder = os.path.join(app.root_path, app.template_folder)
+    written = write_stylesheet(template_folder, app.static_folder)
+    components, css = written if written else ((), "")
+    app.config["COMPONENT_CSS"] = bool(css)
+    loader = ComponentLoader(app.create_global_jinja_loader(), components if css else (), minify)
+    app.jinja_options = {**app.jinja_options, "loader": loader}
+
+
+if __name__ == "__main__":
+    here = os.path.dirname(os.path.abspath(__file__))
+    written = write_stylesheet(os.path.join(here, "templates"), os.path.join(here, "static"))
+    if written is None:
+        print(f"❌ Could not write static/{CSS_FILE}")
+        sys.exit(1)
+    components, css = written
+    print(f"✅ Wrote static/{CSS_FILE} ({len(css)} bytes) from {', '.join(components)}")
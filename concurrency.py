@@ -0,0 +1,39 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import FANOUT_WORKERS
+
+_executor = None
+_executor_lock = threading.Lock()
+_local = threading.local()
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS,
+                                               thread_name_prefix="fanout",
+                                               initializer=_mark_worker)
+    return _executor
+
+
+def _mark_worker():
+    _local.worker = True
+
+
+def gather(*calls):
+    """Run independent zero-argument callables concurrently; return their results in order.
+
+    The first call runs on the calling thread and the rest on a shared pool,
+    so a route waits for its slowest backend call rather than the sum of
+    them. Exceptions are re-raised in the caller. Nested gathers run
+    sequentially so the pool can't deadlock on itself. Calls see the
+    caller's context variables, so their timings count toward its request.
+    """
+    if len(calls) <= 1 or getattr(_local, "worker", False):
+        return [call() for call in calls]
+    futures = [_pool().submit(contextvars.copy_context().run, call) for call in calls[1:]]
+    first = calls[0]()
+    return [first] + [f.result() for f in futures]
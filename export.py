@@ -0,0 +1,443 @@
+"""Static export of the public pages, re-rendered when admins write.
+
+    python export.py                   # render every public page into EXPORT_DIR
+    python export.py --out build/html
+
+The storefront pages (/, /about, /catalog, /blog and each /blog/<id>) only
+change when an admin writes, so they are rendered once through
+create_app()'s test client into plain files:
+
+    index.html  about/index.html  catalog/index.html  catalog/page/2/index.html
+    blog/index.html  blog/page/2/index.html  blog/<id>/index.html
+
+With SERVE_EXPORT on, ``init_app`` answers those URLs from the files
+before any view runs: one file read with ETag/304, instead of Supabase
+calls and a render. Everything else falls through to the normal views:
+- admins, and visitors with a flash message pending (as in page_cache)
+- URLs with other query arguments
+- pages that have no file (yet)
+
+Every write through supabase_db removes the files it affects at once and
+re-renders them on a background thread:
+- a product write: the catalog page holding each row, and / when it is
+  among the first ones. A deleted row shifts every later page, so those
+  go too; so does a new row, which lands on the last page. When the page
+  count changes, the "Page 2 of 7" on every page is re-rendered.
+- a blog write: the posts written and the blog index
+- a site_content write: / and /about, the pages that show it
+
+The page holding a product is found by a binary search over the exported
+catalog pages: the cursor in each page's Next link is the last id on it.
+Those files are shared by every worker, so a write on one sees the pages
+another re-rendered. Products have no page of their own (/product/<id>
+is JSON from the view), so there is no detail page to export.
+
+Bursts of writes are coalesced into one pass. The files are on local
+disk, so every gunicorn worker on the host sees the new ones. They are
+rendered by the worker that wrote, whose caches the write has just cleared.
+
+Serving the files:
+- gunicorn alone: SERVE_EXPORT=True, as above.
+- nginx in front of gunicorn: point ``root`` at EXPORT_DIR and let nginx
+  answer exported URLs without query arguments or a session cookie
+  (admins, pending flashes); the rest, ``?page=`` included, goes to the
+  app, which still answers those from the files with SERVE_EXPORT on::
+
+      root /srv/shop/instance/export;
+      location / {
+          error_page 418 = @app;
+          if ($cookie_session) { return 418; }
+          if ($args) { return 418; }
+          try_files $uri/index.html @app;
+      }
+      location @app { proxy_pass http://127.0.0.1:8000; }
+
+- Vercel: functions can't write their bundle, so vercel.json's build runs
+  ``python3 export.py --out public`` and the CDN serves the files; its
+  routes send ``?page=<n>`` to catalog/page/<n>/index.html and requests
+  with a session cookie to the app. Set EXPORT_DEPLOY_HOOK (a Vercel
+  deploy hook URL) so writes trigger a rebuild instead of a local render.
+"""
+import argparse
+import html
+import logging
+import math
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from flask import request, send_file
+
+import metrics
+from config import SERVE_EXPORT, EXPORT_DIR, EXPORT_DEPLOY_HOOK
+from page_cache import cacheable_request
+from supabase_db import cursor_values, get_session, iter_rows, on_write
+
+log = logging.getLogger(__name__)
+
+PAGES = ("/", "/about")
+# pages that show each table (blog posts add their own /blog/<id>)
+SHOWN_ON = {"products": ("/", "/catalog"), "blog_posts": ("/blog",), "site_content": PAGES}
+LISTINGS = ("/catalog", "/blog")
+EXPORTED = re.compile(r"^/(?:about|catalog|blog(?:/\d+)?)?$")
+NEXT_LINK = re.compile(r'<a\b[^>]*href="([^"]+)"[^>]*>\s*Next')
+PAGE_COUNT = re.compile(r'class="pager-info">\s*Page \d+ of (\d+)')
+# a product write touching more rows than this re-renders the whole catalog
+SCOPED_ROWS = 20
+# set on the export's own renders so they never read the files they write
+RENDERING = "export.rendering"
+
+
+def page_file(out_dir, path, page=1):
+    """File for ``path`` (page ``page`` of a listing) under ``out_dir``."""
+    parts = [p for p in path.strip("/").split("/") if p]
+    if page > 1:
+        parts += ["page", str(page)]
+    return os.path.join(out_dir, *parts, "index.html")
+
+
+class Exporter:
+    def __init__(self, app, out_dir=EXPORT_DIR, deploy_hook=EXPORT_DEPLOY_HOOK):
+        self.app = app
+        self.out_dir = out_dir
+        self.deploy_hook = deploy_hook
+        self._lock = threading.Lock()       # guards _pending/_running
+        self._render_lock = threading.Lock()
+        self._pending = set()
+        self._running = False
+        self.rendered = 0
+        self.failures = 0
+        self.last_seconds = 0.0
+
+    # ---------- RENDER ----------
+    def _write(self, path, page, body):
+        target = page_file(self.out_dir, path, page)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, target)
+        self.rendered += 1
+
+    def _get(self, client, url):
+        r = client.get(url, environ_base={RENDERING: True})
+        if r.status_code != 200:
+            log.warning("⚠️ Export of %s got %s", url, r.status_code)
+            self.failures += 1
+            return None
+        return r.get_data()
+
+    def _render_page(self, client, path):
+        body = self._get(client, path)
+        if body is not None:
+            self._write(path, 1, body)
+
+    def _render_listing(self, client, path, start=1):
+        """Pages ``start``.. of a listing, following its Next links (keyset cursors).
+
+        If that changed the number of pages, the pages before ``start`` are
+        rendered again for their "Page x of N".
+        """
+        before = self._page_count(path)
+        url = self._page_url(path, start)
+        if url is None:
+            url, start = path, 1
+        page, pages = start, before or 1
+        while url:
+            body = self._get(client, url)
+            if body is None:
+                return
+            text = body.decode("utf-8", "replace")
+            found = PAGE_COUNT.search(text)
+            pages = int(found.group(1)) if found else 1
+            if page > pages:
+                break               # the last page emptied by a delete
+            self._write(path, page, body)
+            match = NEXT_LINK.search(text)
+            url = html.unescape(match.group(1)) if match else None
+            page += 1
+        self._prune(path, pages + 1)
+        if start > 1 and pages != before:
+            for earlier in range(1, min(start, pages + 1)):
+                self._render_listing_page(client, path, earlier)
+
+    def _render_listing_page(self, client, path, page):
+        """Page ``page`` of a listing alone; False when there is no cursor to reach it."""
+        url = self._page_url(path, page)
+        if url is None:
+            return False
+        body = self._get(client, url)
+        if body is not None:
+            self._write(path, page, body)
+        return True
+
+    def _page_url(self, path, page):
+        # page n is reached with the cursor in page n-1's Next link
+        if page == 1:
+            return path
+        cursor = self._next_cursor(path, page - 1)
+        return f"{path}?{urlencode({'page': page, 'cursor': cursor})}" if cursor else None
+
+    def _read(self, path, page):
+        try:
+            with open(page_file(self.out_dir, path, page), encoding="utf-8", errors="replace") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _next_cursor(self, path, page):
+        """Cursor of the exported page's Next link: "" on the last page, None without a file."""
+        text = self._read(path, page)
+        if text is None:
+            return None
+        match = NEXT_LINK.search(text)
+        if not match:
+            return ""
+        query = parse_qs(urlsplit(html.unescape(match.group(1))).query)
+        return query.get("cursor", [""])[0]
+
+    def _page_count(self, path):
+        text = self._read(path, 1)
+        if text is None:
+            return None
+        found = PAGE_COUNT.search(text)
+        return int(found.group(1)) if found else 1
+
+    def _page_of(self, path, row_id):
+        """Exported page of a listing ordered by id holding ``row_id``, or None."""
+        pages = self._page_count(path)
+        if pages is None:
+            return None
+        lo, hi = 1, pages
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cursor = self._next_cursor(path, mid)
+            if cursor is None:
+                return None         # dropped by a write in progress
+            last = cursor_values(cursor) if cursor else None
+            if cursor and last is None:
+                return None
+            if last is None or row_id <= last[0]:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _prune(self, path, first_gone):
+        # pages past the new end, left from a longer listing
+        folder = os.path.join(os.path.dirname(page_file(self.out_dir, path)), "page")
+        if not os.path.isdir(folder):
+            return
+        for name in os.listdir(folder):
+            if name.isdigit() and int(name) >= first_gone:
+                shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+
+    def _render_post(self, client, bid):
+        path = f"/blog/{bid}"
+        r = client.get(path, environ_base={RENDERING: True})
+        if r.status_code == 200:
+            self._write(path, 1, r.get_data())
+        else:
+            self._drop_post(bid)
+
+    def _drop_post(self, bid):
+        shutil.rmtree(os.path.dirname(page_file(self.out_dir, f"/blog/{bid}")), ignore_errors=True)
+
+    def export_all(self):
+        """Render every exported page; return the number of files written."""
+        with self._render_lock:
+            before = self.rendered
+            client = self.app.test_client()
+            for path in PAGES:
+                self._render_page(client, path)
+            self._render_listing(client, "/catalog")
+            self._render_listing(client, "/blog")
+            live = set()
+            for row in iter_rows("blog_posts", select="id"):
+                live.add(str(row["id"]))
+                self._render_post(client, row["id"])
+            blog_dir = os.path.join(self.out_dir, "blog")
+            for name in os.listdir(blog_dir) if os.path.isdir(blog_dir) else ():
+                if name.isdigit() and name not in live:
+                    self._drop_post(name)
+            return self.rendered - before
+
+    def regenerate(self, targets):
+        """Re-render ``targets``: page and listing paths, "/blog/<id>" posts, and
+        "<listing>?page=<n>" (that page) or "<listing>?from=<n>" (that page on).
+        """
+        with self._render_lock:
+            before = self.rendered
+            client = self.app.test_client()
+            listings = {}
+            for target in sorted(targets):
+                path, _, arg = target.partition("?")
+                if path in LISTINGS:
+                    listings.setdefault(path, []).append(arg)
+                elif target.startswith("/blog/"):
+                    self._render_post(client, target.rsplit("/", 1)[1])
+                else:
+                    self._render_page(client, target)
+            for path, args in listings.items():
+                self._regenerate_listing(client, path, args)
+            return self.rendered - before
+
+    def _regenerate_listing(self, client, path, args):
+        if "" in args:
+            self._render_listing(client, path)
+            return
+        start = min((int(a[5:]) for a in args if a.startswith("from=")), default=None)
+        for page in sorted({int(a[5:]) for a in args if a.startswith("page=")}):
+            if start is not None and page >= start:
+                break
+            if not self._render_listing_page(client, path, page):
+                self._render_listing(client, path)
+                return
+        if start is not None:
+            self._render_listing(client, path, start)
+
+    # ---------- WRITES ----------
+    def affected(self, table, rows, deleted):
+        """(targets to re-render, blog ids whose file goes away) for one write."""
+        if table not in SHOWN_ON:
+            return set(), set()
+        if table == "products":
+            return self._product_targets(rows, deleted), set()
+        targets = set(SHOWN_ON[table])
+        if table == "blog_posts":
+            targets.update(f"/blog/{row['id']}" for row in rows or () if row.get("id") is not None)
+        return targets, {str(i) for i in deleted or ()} if table == "blog_posts" else set()
+
+    def _product_targets(self, rows, deleted):
+        """The catalog pages, and / if it shows them, holding the products written."""
+        everything = set(SHOWN_ON["products"])
+        if rows is None and deleted is None:
+            return everything
+        changed = [(r.get("id"), False) for r in rows or ()] + [(i, True) for i in deleted or ()]
+        if len(changed) > SCOPED_ROWS or any(i is None for i, _ in changed):
+            return everything
+        config = self.app.config
+        home_pages = math.ceil(config["HOME_FEATURED_COUNT"] / config["PRODUCTS_PER_PAGE"])
+        last = self._page_count("/catalog")
+        targets = set()
+        for row_id, gone in changed:
+            page = self._page_of("/catalog", int(row_id))
+            if page is None:
+                return everything
+            # a deleted row moves every later one up; a new one lands last
+            targets.add(f"/catalog?from={page}" if gone or page == last else f"/catalog?page={page}")
+            if page <= home_pages:
+                targets.add("/")
+        return targets
+
+    def _drop(self, target):
+        path, _, arg = target.partition("?")
+        first = int(arg.partition("=")[2]) if arg else 1
+        if os.path.exists(page_file(self.out_dir, path, first)):
+            os.remove(page_file(self.out_dir, path, first))
+        if path in LISTINGS and not arg.startswith("page="):
+            self._prune(path, first + 1)
+
+    def on_write(self, table, rows, deleted):
+        targets, gone = self.affected(table, rows, deleted)
+        if not targets:
+            return
+        if not self.deploy_hook:
+            # stop serving the old pages right away; until their new files
+            # land the views answer
+            try:
+                for bid in gone:
+                    self._drop_post(bid)
+                for target in targets:
+                    self._drop(target)
+            except OSError as e:
+                log.warning("⚠️ Could not drop exported pages: %s", e)
+        with self._lock:
+            self._pending |= targets
+            if self._running:
+                return
+            self._running = True
+        threading.Thread(target=self._run, name="export", daemon=True).start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                targets, self._pending = self._pending, set()
+                if not targets:
+                    self._running = False
+                    return
+            started = time.perf_counter()
+            try:
+                if self.deploy_hook:
+                    get_session().post(self.deploy_hook, timeout=10).raise_for_status()
+                else:
+                    self.regenerate(targets)
+            except Exception as e:
+                self.failures += 1
+                log.error("❌ Export regeneration failed: %s", e)
+            self.last_seconds = time.perf_counter() - started
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {"rendered": self.rendered, "failures": self.failures, "pending": pending,
+                "last_seconds": round(self.last_seconds, 3)}
+
+    # ---------- SERVE ----------
+    def file_for(self, req):
+        """Exported file answering ``req``, or None if it must go to the view."""
+        if req.method not in ("GET", "HEAD") or not EXPORTED.match(req.path):
+            return None
+        if set(req.args) - {"page", "cursor"}:
+            return None
+        page = req.args.get("page", 1, type=int)
+        if page is None or page < 1 or (page > 1 and req.path not in ("/catalog", "/blog")):
+            return None
+        return page_file(self.out_dir, req.path, page)
+
+    def serve(self):
+        if request.environ.get(RENDERING) or not cacheable_request():
+            return None
+        path = self.file_for(request)
+        if path is None:
+            return None
+        try:
+            resp = send_file(path, mimetype="text/html", conditional=True, etag=True, max_age=None)
+        except OSError:             # not exported, or dropped by a write just now
+            return None
+        resp.headers["Cache-Control"] = "no-cache"
+        metrics.note("export", "hit")
+        return resp
+
+
+def init_app(app):
+    exporter = Exporter(app)
+    app.extensions["export"] = exporter
+    if SERVE_EXPORT or EXPORT_DEPLOY_HOOK:
+        on_write(exporter.on_write)
+    if SERVE_EXPORT:
+        app.before_request(exporter.serve)
+    return exporter
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=EXPORT_DIR, help="output directory")
+    args = parser.parse_args(argv)
+    from app import app
+    started = time.time()
+    exporter = Exporter(app, args.out, deploy_hook=None)
+    count = exporter.export_all()
+    print(f"✅ Exported {count} pages to {args.out} in {time.time() - started:.1f}s")
+    if exporter.failures:
+        print(f"❌ {exporter.failures} page(s) failed to render")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
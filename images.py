@@ -0,0 +1,120 @@
+import os
+import logging
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from config import IMAGE_VARIANT_WIDTHS, IMAGE_WORKERS, IMAGE_ASYNC
+
+from supabase_db import upload_to_supabase_storage
+
+log = logging.getLogger(__name__)
+
+# Encoders for each rendition; WebP for browsers that take it, JPEG fallback.
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+# rendition the plain <img src> / JSON API falls back to
+DEFAULT_WIDTH = 640
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="images")
+    return _executor
+
+
+def _normalise(file_bytes):
+    """Decode, apply EXIF orientation and drop all metadata."""
+    # Pillow is imported on the first upload, not on every cold start
+    from PIL import Image, ImageOps
+    img = Image.open(BytesIO(file_bytes))
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "RGBA"):
+        has_alpha = img.mode in ("LA", "PA") or "transparency" in img.info
+        img = img.convert("RGBA" if has_alpha else "RGB")
+    # a fresh image carries no EXIF/ICC/XMP blocks from the upload
+    clean = Image.new(img.mode, img.size)
+    clean.paste(img)
+    return clean
+
+
+def _widths_for(width):
+    # never upscale: small originals get one rendition at their own width
+    return sorted({w for w in IMAGE_VARIANT_WIDTHS if w < width} | {min(width, max(IMAGE_VARIANT_WIDTHS))})
+
+
+def make_variants(file_bytes):
+    """Yield (width, fmt, content_type, bytes) renditions of an uploaded image."""
+    from PIL import Image
+    img = _normalise(file_bytes)
+    for width in _widths_for(img.width):
+        height = max(1, round(img.height * width / img.width))
+        resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+        for fmt, (pil_format, content_type, options) in FORMATS.items():
+            frame = resized.convert("RGB") if pil_format == "JPEG" and resized.mode != "RGB" else resized
+            out = BytesIO()
+            frame.save(out, pil_format, **options)
+            yield width, fmt, content_type, out.getvalue()
+
+
+def upload_variants(stem, file_bytes):
+    """Encode and upload every rendition; return {"webp": {w: url}, "jpeg": {w: url}}."""
+    variants = {fmt: {} for fmt in FORMATS}
+    for width, fmt, content_type, data in make_variants(file_bytes):
+        url = upload_to_supabase_storage(f"{stem}_{width}.{fmt}", data, content_type)
+        if url:
+            variants[fmt][str(width)] = url
+    return variants
+
+
+def default_url(variants):
+    """Plain JPEG URL to store in the row's ``image`` column."""
+    jpeg = variants.get("jpeg") or {}
+    if not jpeg:
+        return None
+    widths = sorted(int(w) for w in jpeg)
+    fitting = [w for w in widths if w <= DEFAULT_WIDTH]
+    return jpeg[str(fitting[-1] if fitting else widths[0])]
+
+
+def ingest(filename, file_bytes, content_type, update_row, row_id):
+    """Build renditions for ``row_id`` and patch them onto the row.
+
+    Falls back to storing the original bytes if Pillow can't decode them.
+    """
+    try:
+        variants = upload_variants(os.path.splitext(filename)[0], file_bytes)
+        fields = {"image": default_url(variants), "image_variants": variants}
+    except Exception as e:
+        log.warning("⚠️ Could not build image variants, storing original: %s", e)
+        fields = {"image": upload_to_supabase_storage(filename, file_bytes, content_type)}
+    if fields.get("image"):
+        update_row(row_id, fields)
+    else:
+        log.warning("⚠️ No image could be uploaded for %s; row %s was saved without one", filename, row_id)
+    return fields
+
+
+def submit(filename, file_bytes, content_type, update_row, row_id):
+    """Run ``ingest`` on the worker pool so the admin request returns at once.
+
+    Returns the Future, or with IMAGE_ASYNC off (the default on serverless)
+    the fields ``ingest`` stored.
+    """
+    if not IMAGE_ASYNC:
+        return ingest(filename, file_bytes, content_type, update_row, row_id)
+    return _pool().submit(ingest, filename, file_bytes, content_type, update_row, row_id)
+
+
+def srcset(variants):
+    """Jinja filter: {"320": url, ...} -> "url 320w, url2 640w"."""
+    if not variants:
+        return ""
+    return ", ".join(f"{url} {w}w" for w, url in sorted(variants.items(), key=lambda kv: int(kv[0])))
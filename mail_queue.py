@@ -0,0 +1,320 @@
+"""Outbound mail queue with a durable on-disk spool.
+
+``enqueue()`` writes the message to the spool directory and returns at once.
+A background thread sends from the spool in batches over one reused SMTP
+connection, retrying failures with exponential backoff. Anything still
+in the spool when the process stops is sent by the next worker that starts.
+
+A worker claims a file by renaming it to ``<name>.json.<pid>.<nonce>``,
+where the nonce is new in every process. Claims are released when their
+process is gone, when they carry this process's pid but not its nonce (a
+restarted container reuses low pids), or after MAIL_CLAIM_TIMEOUT seconds.
+
+On serverless hosts (Vercel) a background thread does not outlive the
+invocation that started it, so with MAIL_INLINE (the default there)
+``enqueue()`` sends on the request thread instead, together with anything
+else due in the spool. The spool falls back to the temp directory when the
+instance folder is read-only; there it only lasts as long as the instance.
+"""
+import heapq
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+
+log = logging.getLogger(__name__)
+
+# fields copied between flask_mail.Message and the spool file
+FIELDS = ("subject", "sender", "recipients", "reply_to", "body", "html")
+
+
+class MailQueue:
+    def __init__(self, app=None, mail=None):
+        self.app = None
+        self.mail = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self._pid = None
+        self._nonce = None
+        self._delayed = []              # (not_before, name) heap, owned by the sender thread
+        self._delayed_names = set()
+        self.sent = 0
+        self.failed_attempts = 0
+        self.dropped = 0
+        self.last_send_seconds = None
+        self.total_send_seconds = 0.0
+        if app is not None:
+            self.init_app(app, mail)
+
+    def init_app(self, app, mail=None):
+        self.app = app
+        self.mail = mail
+        self.spool_dir = app.config.get('MAIL_SPOOL_DIR') or os.path.join(app.instance_path, 'mail_spool')
+        self.batch_size = app.config.get('MAIL_BATCH_SIZE', 20)
+        self.max_attempts = app.config.get('MAIL_MAX_ATTEMPTS', 8)
+        self.max_backoff = app.config.get('MAIL_MAX_BACKOFF', 300)
+        self.idle_timeout = app.config.get('MAIL_IDLE_TIMEOUT', 30)
+        self.claim_timeout = app.config.get('MAIL_CLAIM_TIMEOUT', 600)
+        self.inline = app.config.get('MAIL_INLINE', False)
+        try:
+            os.makedirs(self.spool_dir, exist_ok=True)
+        except OSError as e:
+            # read-only deploy (Vercel): spool under /tmp rather than fail at import
+            log.warning("⚠️ Could not create mail spool %s, using the temp dir: %s", self.spool_dir, e)
+            self.spool_dir = os.path.join(tempfile.gettempdir(), 'mail_spool')
+            os.makedirs(self.spool_dir, exist_ok=True)
+        app.extensions['mail_queue'] = self
+
+        if not self.inline:
+            # pick up mail spooled before a restart on the first request
+            @app.before_request
+            def _start_mail_worker():
+                self._ensure_worker()
+
+    # ---------- producer side ----------
+    def enqueue(self, message):
+        """Spool ``message`` to disk and hand it to the sender thread."""
+        data = {f: getattr(message, f) for f in FIELDS}
+        data.update(attempts=0, not_before=0, queued_at=time.time())
+        name = f"{time.time_ns()}-{uuid.uuid4().hex}.json"
+        tmp = os.path.join(self.spool_dir, name + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, os.path.join(self.spool_dir, name))  # atomic: never a half-written spool file
+        if self.inline:
+            self._send_inline(name)
+            return name
+        self._ensure_worker()
+        self._queue.put(name)
+        return name
+
+    def _send_inline(self, name):
+        """Send ``name``, and whatever else is due in the spool, on this thread."""
+        with self._lock:
+            self._adopt_process()
+            self._recover_claims()
+            due = [n for n in sorted(os.listdir(self.spool_dir)) if n.endswith('.json') and n != name]
+            self._close(self._send_batch([name] + due[:self.batch_size - 1], None))
+
+    def stats(self):
+        return {
+            'depth': self.depth(),
+            'sent': self.sent,
+            'failed_attempts': self.failed_attempts,
+            'dropped': self.dropped,
+            'last_send_seconds': self.last_send_seconds,
+            'avg_send_seconds': round(self.total_send_seconds / self.sent, 4) if self.sent else None,
+        }
+
+    def depth(self):
+        try:
+            return sum(1 for n in os.listdir(self.spool_dir) if _is_pending(n))
+        except OSError:
+            return 0
+
+    # ---------- consumer side ----------
+    def _adopt_process(self):
+        # a forked child doesn't own the parent's queue or claims
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._queue = queue.Queue()
+            self._nonce = uuid.uuid4().hex[:12]
+
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+                return
+            self._adopt_process()
+            self._delayed, self._delayed_names = [], set()
+            self._worker_pid = pid
+            self._recover_claims()
+            for name in sorted(os.listdir(self.spool_dir)):
+                if name.endswith('.json'):
+                    self._queue.put(name)
+            self._worker = threading.Thread(target=self._run, name='mail-queue', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        with self.app.app_context():
+            conn = None
+            idle_since = next_recovery = time.monotonic()
+            while True:
+                now = time.monotonic()
+                if now >= next_recovery:
+                    for name in self._recover_claims():
+                        self._queue.put(name)
+                    next_recovery = now + self.claim_timeout
+                batch = self._due()
+                if not batch:
+                    try:
+                        batch = [self._queue.get(timeout=self._wait(conn, idle_since, next_recovery))]
+                    except queue.Empty:
+                        if conn is not None and time.monotonic() - idle_since >= self.idle_timeout:
+                            conn = self._close(conn)    # idle: don't hold the SMTP session open
+                        continue
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                conn = self._send_batch(batch, conn)
+                idle_since = time.monotonic()
+
+    def _wait(self, conn, idle_since, next_recovery):
+        """Seconds to block on the queue: until the next backed-off message is due,
+        the SMTP session goes idle, or claims are checked again."""
+        now = time.monotonic()
+        waits = [next_recovery - now]
+        if conn is not None:
+            waits.append(idle_since + self.idle_timeout - now)
+        if self._delayed:
+            waits.append(self._delayed[0][0] - time.time())
+        return max(0.0, min(waits))
+
+    def _delay(self, name, not_before):
+        if name not in self._delayed_names:
+            self._delayed_names.add(name)
+            heapq.heappush(self._delayed, (not_before, name))
+
+    def _due(self):
+        """Names whose backoff has passed, taken off the delayed heap."""
+        due, now = [], time.time()
+        while self._delayed and self._delayed[0][0] <= now and len(due) < self.batch_size:
+            name = heapq.heappop(self._delayed)[1]
+            self._delayed_names.discard(name)
+            due.append(name)
+        return due
+
+    def _mailer(self):
+        # Flask-Mail (and smtplib/email with it) loads on the first send,
+        # not on every cold start
+        if self.mail is None:
+            from flask_mail import Mail
+            self.mail = Mail(self.app)
+        return self.mail
+
+    def _send_batch(self, batch, conn):
+        for name in dict.fromkeys(batch):          # de-dupe re-queued names
+            path = os.path.join(self.spool_dir, name)
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue                            # already sent by another worker
+            if data['not_before'] > time.time():
+                self._delay(name, data['not_before'])
+                continue
+            # claim the file so other workers sharing the spool skip it
+            claimed = f"{path}.{os.getpid()}.{self._nonce}"
+            try:
+                os.rename(path, claimed)
+                os.utime(claimed)               # the lease starts now
+            except OSError:
+                continue
+            path = claimed
+            try:
+                if conn is None:
+                    conn = self._mailer().connect()
+                    conn.__enter__()
+                started = time.perf_counter()
+                conn.send(_message(data))
+                elapsed = time.perf_counter() - started
+                os.remove(path)
+                self.sent += 1
+                self.last_send_seconds = round(elapsed, 4)
+                self.total_send_seconds += elapsed
+            except Exception as e:
+                log.error("Mail error: %s", e)
+                conn = self._close(conn)
+                self.failed_attempts += 1
+                not_before = self._reschedule(path, os.path.join(self.spool_dir, name), data)
+                if not_before is not None:
+                    self._delay(name, not_before)
+        return conn
+
+    def _reschedule(self, claimed, path, data):
+        """Back off a failed send; return when to retry, or None once it is given up on."""
+        data['attempts'] += 1
+        if data['attempts'] >= self.max_attempts:
+            os.replace(claimed, path + '.failed')   # keep it for a human to look at
+            self.dropped += 1
+            return None
+        data['not_before'] = time.time() + min(self.max_backoff, 2 ** data['attempts'])
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+        os.remove(claimed)
+        return data['not_before']
+
+    def _stale_claim(self, path, pid, nonce):
+        if nonce != self._nonce and (pid == os.getpid() or not _alive(pid)):
+            return True     # its process is gone, or an earlier one had our pid
+        try:
+            return time.time() - os.path.getmtime(path) > self.claim_timeout
+        except OSError:
+            return False
+
+    def _recover_claims(self):
+        """Release stale claims back into the spool; return the released names."""
+        released = []
+        for name in os.listdir(self.spool_dir):
+            claim = _parse_claim(name)
+            if claim is None:
+                continue
+            stem, pid, nonce = claim
+            path = os.path.join(self.spool_dir, name)
+            if not self._stale_claim(path, pid, nonce):
+                continue
+            try:
+                os.rename(path, os.path.join(self.spool_dir, stem))
+            except OSError:
+                continue
+            log.warning("⚠️ Released mail %s claimed by pid %s", stem, pid)
+            released.append(stem)
+        return released
+
+    def _close(self, conn):
+        if conn is not None:
+            try:
+                conn.__exit__(None, None, None)
+            except Exception:
+                pass
+        return None
+
+
+def _parse_claim(name):
+    """(spool name, pid, nonce) for a claimed ``<name>.json.<pid>.<nonce>``, else None."""
+    stem, sep, owner = name.partition('.json.')
+    pid, _, nonce = owner.partition('.')
+    if not sep or not pid.isdigit():
+        return None
+    return stem + '.json', int(pid), nonce
+
+
+def _is_pending(name):
+    return name.endswith('.json') or _parse_claim(name) is not None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _message(data):
+    from flask_mail import Message
+    return Message(**{f: data[f] for f in FIELDS})
@@ -0,0 +1,216 @@
+"""Maintenance jobs against the live Supabase tables and the uploads bucket.
+
+    python maintenance.py delete products --where image=is.null --dry-run
+    python maintenance.py update products --where price=lt.0 --set price=0
+    python maintenance.py storage-gc --dry-run
+    python maintenance.py storage-gc --min-age-hours 48 --workers 8
+
+delete/update read the table in keyset pages of ``--batch`` rows. Each page
+is handled with one id=in.(...) request, so memory stays flat and nothing
+is done row by row. ``--where`` takes PostgREST filters (``column=op.value``)
+and can be repeated; all of them must match. Deleted products and posts
+take their images along, unless another row still uses them.
+
+storage-gc lists uploads/profile_images/ and collects every image and
+variant URL in products and blog_posts. Objects nothing points at are
+deleted in parallel batches of ``--delete-batch`` paths. Objects younger
+than ``--min-age-hours`` are kept, because an upload lands a moment before
+its row is updated to point at it. The tables are read after the listing,
+so only a reference added while the job runs can race it.
+
+--dry-run reports what would happen and changes nothing.
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import unquote
+
+from config import GC_MIN_AGE_HOURS, GC_DELETE_BATCH, GC_WORKERS
+from supabase_db import (
+    BUCKET, UPLOAD_PREFIX, delete_blogs, delete_products, image_urls, iter_pages,
+    list_storage_objects, remove_storage_objects, update_blogs, update_products
+)
+
+TABLES = {
+    'products': (delete_products, update_products),
+    'blog_posts': (delete_blogs, update_blogs),
+}
+PUBLIC_MARKER = f"/storage/v1/object/public/{BUCKET}/"
+
+
+# ---------- ROWS ----------
+def _where(filters):
+    return '&'.join(filters) or None
+
+
+def parse_assignments(pairs):
+    """["price=0", "name=Candle"] -> {"price": 0, "name": "Candle"}; values are JSON when they parse."""
+    fields = {}
+    for pair in pairs:
+        column, sep, raw = pair.partition('=')
+        if not sep or not column:
+            raise ValueError(f"expected column=value, got {pair!r}")
+        try:
+            fields[column] = json.loads(raw)
+        except ValueError:
+            fields[column] = raw
+    return fields
+
+
+def delete_matching(table, filters, batch_size=500, dry_run=False):
+    """Delete the rows of ``table`` matching ``filters``; return (deleted, failed batches)."""
+    delete = TABLES[table][0]
+    done = failed = 0
+    for rows in iter_pages(table, batch_size, select='id', where=_where(filters)):
+        ids = [row['id'] for row in rows]
+        if dry_run:
+            print(f"🔹 would delete {table} {ids[0]}..{ids[-1]} ({len(ids)} rows)")
+            done += len(ids)
+            continue
+        deleted = delete(ids)
+        if deleted is None:
+            print(f"❌ {table} {ids[0]}..{ids[-1]}: delete failed")
+            failed += 1
+            continue
+        print(f"🗑️ {table}: deleted {len(deleted)} rows")
+        done += len(deleted)
+    return done, failed
+
+
+def update_matching(table, filters, fields, batch_size=500, dry_run=False):
+    """Apply ``fields`` to the rows of ``table`` matching ``filters``; return (updated, failed batches)."""
+    update = TABLES[table][1]
+    done = failed = 0
+    for rows in iter_pages(table, batch_size, select='id', where=_where(filters)):
+        ids = [row['id'] for row in rows]
+        if dry_run:
+            print(f"🔹 would update {table} {ids[0]}..{ids[-1]} ({len(ids)} rows)")
+            done += len(ids)
+            continue
+        updated = update(ids, fields)
+        if updated is None:
+            print(f"❌ {table} {ids[0]}..{ids[-1]}: update failed")
+            failed += 1
+            continue
+        done += len(updated)
+    return done, failed
+
+
+# ---------- STORAGE ----------
+def bucket_path(url):
+    """``profile_images/...`` for a public URL into our bucket (any host), else None."""
+    if not url or PUBLIC_MARKER not in url:
+        return None
+    return unquote(url.split(PUBLIC_MARKER, 1)[1].split('?', 1)[0])
+
+
+def referenced_paths(batch_size=500):
+    """Every bucket path an ``image`` or ``image_variants`` URL points at."""
+    paths = set()
+    for table in TABLES:
+        for rows in iter_pages(table, batch_size, select='id,image,image_variants'):
+            for row in rows:
+                paths.update(p for p in map(bucket_path, image_urls(row)) if p)
+    return paths
+
+
+def _age_hours(info, now):
+    created = info.get('created_at')
+    if not created:
+        return float('inf')     # no timestamp to go by
+    return (now - datetime.fromisoformat(created.replace('Z', '+00:00'))).total_seconds() / 3600
+
+
+def find_orphans(min_age_hours=GC_MIN_AGE_HOURS, batch_size=500):
+    """(orphans as [(path, size)], objects listed, kept because they are too new)."""
+    now = datetime.now(timezone.utc)
+    listed = list(list_storage_objects(UPLOAD_PREFIX))
+    in_use = referenced_paths(batch_size)
+    orphans, young = [], 0
+    for path, info in listed:
+        if path in in_use:
+            continue
+        if _age_hours(info, now) < min_age_hours:
+            young += 1
+            continue
+        orphans.append((path, (info.get('metadata') or {}).get('size') or 0))
+    return orphans, len(listed), young
+
+
+def remove_in_batches(paths, batch_size=GC_DELETE_BATCH, workers=GC_WORKERS):
+    """Delete ``paths`` with ``workers`` concurrent batch requests; return (removed, failed batches)."""
+    batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+
+    def remove(batch):
+        try:
+            return remove_storage_objects(batch)
+        except Exception as e:
+            print(f"❌ {batch[0]}..{batch[-1]}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gc') as pool:
+        results = list(pool.map(remove, batches))
+    return sum(r for r in results if r is not None), sum(r is None for r in results)
+
+
+def storage_gc(min_age_hours=GC_MIN_AGE_HOURS, batch_size=GC_DELETE_BATCH, workers=GC_WORKERS,
+               dry_run=False, scan_batch=500):
+    """Remove unreferenced objects under profile_images/; return (removed, failed batches)."""
+    orphans, listed, young = find_orphans(min_age_hours, scan_batch)
+    size = sum(s for _, s in orphans)
+    print(f"🔹 {listed} objects under {UPLOAD_PREFIX}/: {len(orphans)} unreferenced "
+          f"({size / 1e6:.1f} MB), {young} newer than {min_age_hours:g}h kept")
+    if dry_run or not orphans:
+        for path, _ in orphans[:20]:
+            print(f"   {path}")
+        return 0, 0
+    return remove_in_batches([p for p, _ in orphans], batch_size, workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--dry-run', action='store_true', help='report without changing anything')
+    common.add_argument('--batch', type=int, default=500, help='rows per page when scanning tables')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    delete = commands.add_parser('delete', parents=[common], help='delete matching rows')
+    delete.add_argument('table', choices=TABLES)
+    delete.add_argument('--where', action='append', required=True, help='PostgREST filter, e.g. image=is.null')
+
+    update = commands.add_parser('update', parents=[common], help='set columns on matching rows')
+    update.add_argument('table', choices=TABLES)
+    update.add_argument('--where', action='append', default=[], help='PostgREST filter, e.g. price=lt.0')
+    update.add_argument('--set', action='append', required=True, metavar='COLUMN=VALUE')
+
+    gc = commands.add_parser('storage-gc', parents=[common], help='delete bucket objects no row points at')
+    gc.add_argument('--min-age-hours', type=float, default=GC_MIN_AGE_HOURS)
+    gc.add_argument('--delete-batch', type=int, default=GC_DELETE_BATCH)
+    gc.add_argument('--workers', type=int, default=GC_WORKERS)
+
+    args = parser.parse_args(argv)
+    started = time.time()
+    verb = 'would be ' if args.dry_run else ''
+    if args.command == 'delete':
+        done, failed = delete_matching(args.table, args.where, args.batch, args.dry_run)
+        print(f"✅ {done} {args.table} rows {verb}deleted, {failed} batch(es) failed")
+    elif args.command == 'update':
+        try:
+            fields = parse_assignments(args.set)
+        except ValueError as e:
+            parser.error(str(e))
+        done, failed = update_matching(args.table, args.where, fields, args.batch, args.dry_run)
+        print(f"✅ {done} {args.table} rows {verb}updated, {failed} batch(es) failed")
+    else:
+        done, failed = storage_gc(args.min_age_hours, args.delete_batch, args.workers, args.dry_run, args.batch)
+        if not args.dry_run:
+            print(f"✅ Removed {done} objects, {failed} batch(es) failed")
+    print(f"🔹 took {time.time() - started:.1f}s")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
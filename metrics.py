@@ -0,0 +1,285 @@
+"""Request, Supabase and template timings: histograms, Server-Timing, /metrics.
+
+Each request gets a phase accumulator in a context variable, which
+concurrency.gather carries into its pool threads. What feeds it:
+- supabase_db reports every REST and Storage call, with table and verb
+- Jinja renders add a ``render`` phase
+
+When the request finishes, its route histogram is updated. The response
+gets a ``Server-Timing`` header listing the phases, which browser devtools
+show per request. One structured log line is written.
+
+``/metrics`` serves everything in the Prometheus text format to scrapers
+sending ``Authorization: Bearer <METRICS_TOKEN>``; without a token
+configured it answers 404 to everyone. Numbers are
+per process, so every gunicorn worker is its own scrape target. Recording
+costs two perf_counter() calls and one locked bucket increment.
+"""
+import contextvars
+import hmac
+import json
+import logging
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, abort, g, request
+from flask.signals import before_render_template, template_rendered
+
+from config import LOG_LEVEL, LOG_FORMAT, LOG_REQUESTS, METRICS_TOKEN
+
+# seconds; Prometheus "le" upper bounds, +Inf is implied
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+log = logging.getLogger(__name__)
+access_log = logging.getLogger("access")
+
+_lock = threading.Lock()
+_histograms = {}    # (name, labels) -> _Histogram
+_counters = {}      # (name, labels) -> number
+_gauges = []        # (prefix, stats function)
+_current = contextvars.ContextVar("metrics_request", default=None)
+
+HELP = {
+    "http_request_duration_seconds": ("histogram", "Time to produce a response, by route"),
+    "http_requests_total": ("counter", "Responses by route and status"),
+    "supabase_request_duration_seconds": ("histogram", "Supabase REST/Storage call time by resource and verb"),
+    "supabase_requests_total": ("counter", "Supabase calls by resource, verb and status (or error)"),
+    "template_render_seconds": ("histogram", "Jinja render time by template"),
+    "login_attempts_total": ("counter", "Admin login attempts by result (ok, wrong, or why it was throttled)"),
+    "login_hash_seconds": ("histogram", "Time to verify the admin password hash"),
+}
+
+
+class _Histogram:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+def observe(name, labels, seconds):
+    """Add ``seconds`` to histogram ``name``; ``labels`` is a tuple of (key, value) pairs."""
+    with _lock:
+        h = _histograms.get((name, labels))
+        if h is None:
+            h = _histograms[(name, labels)] = _Histogram()
+        h.buckets[bisect_left(BUCKETS, seconds)] += 1
+        h.sum += seconds
+        h.count += 1
+
+
+def inc(name, labels, amount=1):
+    with _lock:
+        _counters[(name, labels)] = _counters.get((name, labels), 0) + amount
+
+
+def register_gauges(prefix, stats):
+    """Export every numeric value of ``stats()`` as gauge ``<prefix>_<key>`` on each scrape."""
+    _gauges.append((prefix, stats))
+
+
+# ---------- PER REQUEST ----------
+class _Request:
+    __slots__ = ("started", "phases", "notes", "renders", "token")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []        # (phase, seconds); list.append is safe from any thread
+        self.notes = []
+        self.renders = []       # start times of renders in progress
+        self.token = None
+
+    def summary(self):
+        totals = {}
+        for phase, seconds in self.phases:
+            entry = totals.setdefault(phase, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+        return totals
+
+
+def record(phase, seconds):
+    """Charge ``seconds`` to ``phase`` of the current request, if any."""
+    current = _current.get()
+    if current is not None:
+        current.phases.append((phase, seconds))
+
+
+def note(name, desc):
+    """Add a duration-less Server-Timing entry, e.g. note("cache", "hit")."""
+    current = _current.get()
+    if current is not None:
+        current.notes.append((name, desc))
+
+
+def backend_call(api, resource, method, status, seconds):
+    """One Supabase call: ``api`` is "rest" or "storage", ``status`` a code or "error"."""
+    labels = (("api", api), ("resource", resource), ("method", method))
+    observe("supabase_request_duration_seconds", labels, seconds)
+    inc("supabase_requests_total", labels + (("status", str(status)),))
+    record(api, seconds)
+
+
+def server_timing(phases, notes, total):
+    parts = [f'{phase};dur={seconds * 1000:.1f};desc="{count} call{"s" if count != 1 else ""}"'
+             if phase in ("rest", "storage") else f"{phase};dur={seconds * 1000:.1f}"
+             for phase, (seconds, count) in phases.items()]
+    parts += [f'{name};desc="{desc}"' for name, desc in notes]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _start_request():
+    current = _Request()
+    current.token = _current.set(current)
+    g._metrics = current
+
+
+def _finish_request(response):
+    current = g.get("_metrics")
+    if current is None:
+        return response
+    total = time.perf_counter() - current.started
+    # unmatched URLs share one label so scanners can't mint new series
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    labels = (("route", route), ("method", request.method))
+    observe("http_request_duration_seconds", labels, total)
+    inc("http_requests_total", labels + (("status", str(response.status_code)),))
+    phases = current.summary()
+    response.headers["Server-Timing"] = server_timing(phases, current.notes, total)
+    if LOG_REQUESTS:
+        access_log.info("%s %s %s %.1fms", request.method, request.path, response.status_code, total * 1000,
+                        extra={"route": route, "method": request.method, "status": response.status_code,
+                               "ms": round(total * 1000, 1),
+                               "phases": {p: round(s * 1000, 1) for p, (s, _) in phases.items()},
+                               "calls": sum(n for p, (_, n) in phases.items() if p in ("rest", "storage"))})
+    return response
+
+
+def _end_request(exc):
+    current = g.pop("_metrics", None)
+    if current is not None and current.token is not None:
+        _current.reset(current.token)
+
+
+def _render_started(sender, template, context, **extra):
+    current = _current.get()
+    if current is not None:
+        current.renders.append(time.perf_counter())
+
+
+def _render_finished(sender, template, context, **extra):
+    current = _current.get()
+    if current is not None and current.renders:
+        seconds = time.perf_counter() - current.renders.pop()
+        observe("template_render_seconds", (("template", template.name or "string"),), seconds)
+        if not current.renders:         # includes/nested renders count once
+            current.phases.append(("render", seconds))
+
+
+# ---------- EXPOSITION ----------
+def _labels(pairs, extra=()):
+    pairs = tuple(pairs) + tuple(extra)
+    if not pairs:
+        return ""
+    body = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                    for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {k: (list(h.buckets), h.sum, h.count) for k, h in _histograms.items()}
+        counters = dict(_counters)
+    lines = []
+    by_name = {}
+    for (name, labels), value in list(histograms.items()) + list(counters.items()):
+        by_name.setdefault(name, []).append((labels, value))
+    for name in sorted(by_name):
+        kind, text = HELP.get(name, ("untyped", name))
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+        for labels, value in sorted(by_name[name]):
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            buckets, total, count = value
+            running = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), buckets):
+                running += n
+                lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {running}")
+            lines.append(f"{name}_sum{_labels(labels)} {total!r}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+    for prefix, stats in _gauges:
+        try:
+            values = stats() or {}
+        except Exception as e:
+            log.warning("⚠️ Could not collect %s metrics: %s", prefix, e)
+            continue
+        for key, value in sorted(values.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            lines += [f"# TYPE {prefix}_{key} gauge", f"{prefix}_{key} {_number(value)}"]
+    return "\n".join(lines) + "\n"
+
+
+# ---------- LOGGING ----------
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; ``extra={...}`` fields become top-level keys."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update((k, v) for k, v in vars(record).items() if k not in _RESERVED)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """Send this app's log records to stderr, as JSON lines or plain text."""
+    root = logging.getLogger()
+    if any(getattr(h, "_royal", False) for h in root.handlers):
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler._royal = True
+    handler.setFormatter(JsonFormatter() if fmt == "json"
+                         else logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(level)
+    if LOG_REQUESTS:
+        # the request line is written by access_log; don't print it twice
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+
+def init_app(app):
+    configure_logging()
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+
+    @app.route("/metrics")
+    def metrics():
+        if not METRICS_TOKEN:
+            abort(404)      # not exposed until a scraper token is configured
+        if not hmac.compare_digest(request.headers.get("Authorization", "").encode(),
+                                   f"Bearer {METRICS_TOKEN}".encode()):
+            abort(401)
+        return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,91 @@
+"""Move product and blog images to content-addressed storage paths.
+
+Re-uploads every image that isn't already stored as
+profile_images/<sha256>.<ext> (identical files collapse to one object) and
+rewrites the ``image`` / ``image_variants`` URLs on the row.
+
+    python migrate_uploads.py            # migrate
+    python migrate_uploads.py --dry-run  # only report what would change
+
+Relative names left over from the local-upload days (``prod_437_item_6.jpg``)
+are read from static/uploads/. Old objects are left in the bucket.
+"""
+import argparse
+import mimetypes
+import os
+
+from supabase_db import (
+    CONTENT_ADDRESSED, content_path, get_session, iter_rows, update_blog, update_product,
+    upload_to_supabase_storage
+)
+
+LOCAL_UPLOADS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
+TABLES = {'products': update_product, 'blog_posts': update_blog}
+
+
+def _read(ref):
+    if ref.startswith(('http://', 'https://')):
+        r = get_session().get(ref, timeout=30)
+        r.raise_for_status()
+        return r.content
+    with open(os.path.join(LOCAL_UPLOADS, os.path.basename(ref)), 'rb') as f:
+        return f.read()
+
+
+def migrate_url(ref, done, dry_run=False):
+    """Return the content-addressed URL for ``ref`` (memoised in ``done``)."""
+    if not ref or CONTENT_ADDRESSED.search(ref):
+        return ref
+    if ref not in done:
+        name = ref.split('?', 1)[0].rsplit('/', 1)[-1]
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        data = _read(ref)
+        if dry_run:
+            done[ref] = content_path(data, name)
+        else:
+            done[ref] = upload_to_supabase_storage(name, data, content_type)
+    return done[ref]
+
+
+def migrate_row(row, done, dry_run=False):
+    """Fields to patch onto ``row``, or {} if it is already migrated."""
+    fields = {}
+    new_image = migrate_url(row.get('image'), done, dry_run)
+    if new_image != row.get('image'):
+        fields['image'] = new_image
+    variants = row.get('image_variants') or {}
+    new_variants = {fmt: {w: migrate_url(u, done, dry_run) for w, u in urls.items()}
+                    for fmt, urls in variants.items()}
+    if new_variants != variants:
+        fields['image_variants'] = new_variants
+    return fields
+
+
+def main(dry_run=False):
+    done = {}
+    for table, update in TABLES.items():
+        changed = failed = 0
+        for row in iter_rows(table):
+            try:
+                fields = migrate_row(row, done, dry_run)
+            except Exception as e:
+                print(f"❌ {table} {row['id']}: {e}")
+                failed += 1
+                continue
+            if not fields:
+                continue
+            if None in fields.values() or (dry_run is False and not update(row['id'], fields)):
+                print(f"❌ {table} {row['id']}: upload or update failed")
+                failed += 1
+                continue
+            print(f"🔹 {table} {row['id']}: {row.get('image')} -> {fields.get('image', '(variants only)')}")
+            changed += 1
+        print(f"✅ {table}: {changed} row(s) {'would change' if dry_run else 'migrated'}, {failed} failed")
+    unique = len(set(done.values()))
+    print(f"✅ {len(done)} image reference(s) -> {unique} stored object(s)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='report changes without uploading or updating')
+    main(parser.parse_args().dry_run)
@@ -0,0 +1,4 @@
+-- Responsive renditions for uploaded images (written by images.py).
+-- Shape: {"webp": {"320": "<url>", "640": ...}, "jpeg": {...}}
+alter table products   add column if not exists image_variants jsonb;
+alter table blog_posts add column if not exists image_variants jsonb;
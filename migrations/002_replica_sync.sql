@@ -0,0 +1,54 @@
+-- Change tracking for the local read replica (replica.py).
+-- Every insert/update stamps updated_at; every delete leaves a tombstone in
+-- deleted_rows. The replica asks for rows and tombstones past its watermark.
+alter table products     add column if not exists updated_at timestamptz not null default now();
+alter table blog_posts   add column if not exists updated_at timestamptz not null default now();
+alter table site_content add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists products_updated_at_id     on products     (updated_at, id);
+create index if not exists blog_posts_updated_at_id   on blog_posts   (updated_at, id);
+create index if not exists site_content_updated_at_id on site_content (updated_at, id);
+
+create or replace function set_updated_at() returns trigger language plpgsql as $$
+begin
+  new.updated_at := now();
+  return new;
+end $$;
+
+drop trigger if exists products_set_updated_at on products;
+create trigger products_set_updated_at before update on products
+  for each row execute function set_updated_at();
+drop trigger if exists blog_posts_set_updated_at on blog_posts;
+create trigger blog_posts_set_updated_at before update on blog_posts
+  for each row execute function set_updated_at();
+drop trigger if exists site_content_set_updated_at on site_content;
+create trigger site_content_set_updated_at before update on site_content
+  for each row execute function set_updated_at();
+
+-- Only prune tombstones older than the longest a replica may stay offline;
+-- a replica that misses one keeps the deleted row until its next --full sync.
+create table if not exists deleted_rows (
+  id         bigserial primary key,
+  table_name text not null,
+  row_id     bigint not null,
+  deleted_at timestamptz not null default now()
+);
+create index if not exists deleted_rows_table_deleted_at on deleted_rows (table_name, deleted_at);
+grant select on deleted_rows to anon, authenticated;
+
+-- security definer: the API role deleting the row can't insert here itself
+create or replace function record_delete() returns trigger language plpgsql security definer as $$
+begin
+  insert into deleted_rows (table_name, row_id) values (tg_table_name, old.id);
+  return old;
+end $$;
+
+drop trigger if exists products_record_delete on products;
+create trigger products_record_delete after delete on products
+  for each row execute function record_delete();
+drop trigger if exists blog_posts_record_delete on blog_posts;
+create trigger blog_posts_record_delete after delete on blog_posts
+  for each row execute function record_delete();
+drop trigger if exists site_content_record_delete on site_content;
+create trigger site_content_record_delete after delete on site_content
+  for each row execute function record_delete();
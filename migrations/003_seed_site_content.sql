@@ -0,0 +1,7 @@
+-- Default site copy, seeded once here instead of on every app start
+-- (`flask --app app seed-content` does the same with one bulk upsert).
+-- Keys that already exist keep their edited values.
+insert into site_content (key, value) values
+  ('about', 'Royal Radiance — handcrafted candles to light your moments. Edit this in admin.'),
+  ('special_offer', 'Limited-time: Golden Autumn collection — 20% off!')
+on conflict (key) do nothing;
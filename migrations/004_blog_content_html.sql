@@ -0,0 +1,3 @@
+-- Blog bodies pre-rendered to sanitized HTML when a post is saved
+-- (richtext.py). Older posts: python richtext.py --backfill
+alter table blog_posts add column if not exists content_html text;
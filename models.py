@@ -9,6 +9,7 @@ class Product(db.Model):
     short_desc = db.Column(db.String(280))
     price = db.Column(db.Float, nullable=False, default=0.0)
     image = db.Column(db.String(300))
+    image_variants = db.Column(db.JSON)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class BlogPost(db.Model):
@@ -16,7 +17,9 @@ class BlogPost(db.Model):
     title = db.Column(db.String(200), nullable=False)
     excerpt = db.Column(db.String(400))
     content = db.Column(db.Text)
+    content_html = db.Column(db.Text)   # sanitized render of content (richtext.py)
     image = db.Column(db.String(300))
+    image_variants = db.Column(db.JSON)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class SiteContent(db.Model):
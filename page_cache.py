@@ -0,0 +1,71 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, make_response, request, session
+
+import metrics
+from cache import TTLCache
+from config import PAGE_CACHE_TTL, PAGE_CACHE_MAX_ENTRIES
+from supabase_db import data_version
+
+# Rendered public pages keyed by route + arguments + data version. Any
+# write through supabase_db bumps the version, so old entries simply stop
+# being looked up; the TTL picks up writes made by other workers.
+pages = TTLCache(ttl=PAGE_CACHE_TTL, max_entries=PAGE_CACHE_MAX_ENTRIES)
+
+
+class _Page:
+    __slots__ = ("body", "mimetype", "etag", "last_modified")
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def cacheable_request():
+    # admins and anyone with a pending flash message get a fresh render,
+    # so session-specific output never lands in the shared cache
+    return (request.method in ("GET", "HEAD")
+            and not session.get("admin_logged")
+            and not session.get("_flashes"))
+
+
+def _key():
+    args = ",".join(f"{k}={v}" for k, v in sorted((request.view_args or {}).items()))
+    return f"{request.endpoint}|{args}|{request.query_string.decode('latin-1')}|{data_version()}"
+
+
+def _respond(page):
+    resp = Response(page.body, mimetype=page.mimetype)
+    resp.set_etag(page.etag)
+    resp.last_modified = page.last_modified
+    resp.headers["Cache-Control"] = "no-cache"     # always revalidate, usually a 304
+    return resp.make_conditional(request)
+
+
+def cached_page(view):
+    """Serve a public view from the render cache with ETag/Last-Modified.
+
+    A matching ``If-None-Match`` / ``If-Modified-Since`` on a cached page is
+    answered with 304 without calling the view (no Supabase, no Jinja).
+    Only 200 responses are stored.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not cacheable_request():
+            return view(*args, **kwargs)
+        key = _key()
+        page = pages.peek(key)
+        if page is None:
+            resp = make_response(view(*args, **kwargs))
+            if resp.status_code != 200 or resp.direct_passthrough or session.get("_flashes"):
+                return resp
+            page = _Page(resp.get_data(), resp.mimetype)
+            pages.set(key, page)
+        else:
+            metrics.note("cache", "hit")
+        return _respond(page)
+    return wrapper
@@ -0,0 +1,389 @@
+"""Local SQLite read replica of the Supabase tables.
+
+    REPLICA_ENABLED=True gunicorn app:create_app()
+    python replica.py [--full]      # one-off sync, e.g. from cron or a deploy hook
+
+The first sync copies products, blog_posts and site_content into
+``REPLICA_PATH``. After that a background thread asks Supabase only for
+rows whose ``updated_at`` is at or past the table's watermark, plus the
+tombstones in ``deleted_rows`` (migrations/002_replica_sync.sql adds both).
+Writes still go to Supabase; a write listener pulls the changed rows back
+at once, so the admin sees their edit on the next page.
+
+Once every table has synced, the supabase_db getters answer from here with
+local indexed queries. Until then, and whenever the replica is off, they
+read from Supabase as before. Without the migration a table is reloaded in
+full on each sync instead.
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from config import REPLICA_ENABLED, REPLICA_PATH, REPLICA_SYNC_INTERVAL, REPLICA_SYNC_OVERLAP
+from supabase_db import (
+    SupabaseError, _decode_cursor, _page_result, data_changed, get_tombstones, iter_changes,
+    iter_rows, on_write, use_replica
+)
+
+log = logging.getLogger(__name__)
+
+# Mirrors models.py, plus updated_at for the sync watermark. Timestamps are
+# kept as PostgREST sends them (ISO 8601 in UTC), which sort as text.
+TABLES = {
+    "products": {
+        "id": "INTEGER PRIMARY KEY", "name": "TEXT", "short_desc": "TEXT", "price": "REAL",
+        "image": "TEXT", "image_variants": "TEXT", "created_at": "TEXT", "updated_at": "TEXT",
+    },
+    "blog_posts": {
+        "id": "INTEGER PRIMARY KEY", "title": "TEXT", "excerpt": "TEXT", "content": "TEXT",
+        "content_html": "TEXT", "image": "TEXT", "image_variants": "TEXT", "created_at": "TEXT", "updated_at": "TEXT",
+    },
+    "site_content": {
+        "id": "INTEGER PRIMARY KEY", "key": "TEXT NOT NULL UNIQUE", "value": "TEXT",
+        "created_at": "TEXT", "updated_at": "TEXT",
+    },
+}
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS products_created_at ON products (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS blog_posts_created_at ON blog_posts (created_at, id)",
+)
+JSON_COLUMNS = {"image_variants"}
+EPOCH = "1970-01-01T00:00:00+00:00"
+# how often the sync thread checks whether another worker changed the file
+POLL_SECONDS = 1.0
+# PostgREST/Postgres codes for an unknown column or table: the database has
+# no migrations/002_replica_sync.sql, so there is nothing to sync incrementally
+SCHEMA_MISSING = {"42703", "42P01", "PGRST200", "PGRST204", "PGRST205"}
+
+
+def _shift(stamp, seconds):
+    moved = datetime.fromisoformat(stamp) + timedelta(seconds=seconds)
+    return moved.astimezone(timezone.utc).isoformat()
+
+
+def _latest(*stamps):
+    stamps = [s for s in stamps if s]
+    return max(stamps, key=datetime.fromisoformat) if stamps else None
+
+
+def _stamp(row):
+    return row.get("updated_at") or row.get("created_at")
+
+
+def _schema_missing(error):
+    return error.status in (400, 404) and error.code in SCHEMA_MISSING
+
+
+class Replica:
+    def __init__(self, path=REPLICA_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self._seen_version = None
+        # tables whose incremental query failed (migration not applied)
+        self._full_only = set()
+        self.last_sync = None
+        self.last_sync_seconds = None
+        self.rows_applied = 0
+        self.skipped = []               # tables the last sync couldn't read
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        with conn:
+            self._create(conn)
+        self.ready = self._synced(conn)
+
+    # ---------- SQLITE ----------
+    def _conn(self):
+        """One connection per thread (and per process after a fork)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")     # readers never wait for the sync writer
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _create(self, conn):
+        for table, columns in TABLES.items():
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ("
+                         + ", ".join(f'"{c}" {t}' for c, t in columns.items()) + ")")
+            have = {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}
+            for column, decl in columns.items():
+                if column not in have:
+                    conn.execute(f'ALTER TABLE {table} ADD COLUMN "{column}" {decl}')
+        for sql in INDEXES:
+            conn.execute(sql)
+        conn.execute("CREATE TABLE IF NOT EXISTS sync_state "
+                     "(table_name TEXT PRIMARY KEY, watermark TEXT, synced_at REAL)")
+
+    def _synced(self, conn):
+        done = {r[0] for r in conn.execute("SELECT table_name FROM sync_state")}
+        return done >= set(TABLES)
+
+    @staticmethod
+    def _decode(row):
+        row = dict(row)
+        for column in JSON_COLUMNS:
+            if isinstance(row.get(column), str):
+                row[column] = json.loads(row[column])
+        return row
+
+    def _rows(self, sql, params=()):
+        return [self._decode(r) for r in self._conn().execute(sql, params)]
+
+    # ---------- READS ----------
+    def _columns(self, table, select):
+        if select == "*":
+            return "*"
+        names = select.split(",")
+        unknown = set(names) - set(TABLES[table])
+        if unknown:
+            raise ValueError(f"unknown {table} columns: {sorted(unknown)}")
+        return ", ".join(f'"{n}"' for n in names)
+
+    def all_rows(self, table, select="*"):
+        return self._rows(f"SELECT {self._columns(table, select)} FROM {table} ORDER BY id")
+
+    def count(self, table):
+        return self._conn().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def get_row(self, table, row_id):
+        rows = self._rows(f"SELECT * FROM {table} WHERE id = ?", (int(row_id),))
+        return rows[0] if rows else None
+
+    def page(self, table, order, limit, cursor=None, page=1, select="*"):
+        """Same result shape and cursors as supabase_db._fetch_page."""
+        page = max(1, int(page or 1))
+        columns = self._columns(table, select)
+        values = _decode_cursor(cursor, order) if cursor else None
+        order_by = ", ".join(f"{col} {'DESC' if desc else 'ASC'}" for col, desc in order)
+        if values is None:
+            rows = self._rows(f"SELECT {columns} FROM {table} ORDER BY {order_by} LIMIT ? OFFSET ?",
+                              (limit, (page - 1) * limit))
+        else:
+            where, params = _keyset_where(order, values)
+            rows = self._rows(f"SELECT {columns} FROM {table} WHERE {where} ORDER BY {order_by} LIMIT ?",
+                              (*params, limit))
+        return _page_result(rows, order, limit, page, self.count(table))
+
+    def site_content(self):
+        return {r["key"]: r["value"] for r in self._conn().execute("SELECT key, value FROM site_content")}
+
+    # ---------- SYNC ----------
+    def sync(self, tables=tuple(TABLES), full=False):
+        """Bring ``tables`` up to date with Supabase; return the number of rows changed."""
+        with self._lock:
+            started = time.perf_counter()
+            conn = self._conn()
+            changed = 0
+            skipped = []
+            for table in tables:
+                if table not in TABLES:
+                    continue
+                try:
+                    n = self._sync_table(conn, table, full)
+                except (requests.RequestException, SupabaseError) as e:
+                    # outage, timeout, 5xx or open breaker: this table keeps its
+                    # watermark, so the next sync picks up from there
+                    log.warning("⚠️ Skipping %s sync this cycle: %s", table, e)
+                    skipped.append(table)
+                    continue
+                if n:
+                    data_changed(table)     # re-render pages built from the old rows
+                changed += n
+            self.rows_applied += changed
+            self.ready = self._synced(conn)
+            self.last_sync = time.time()
+            self.last_sync_seconds = round(time.perf_counter() - started, 4)
+            self.skipped = skipped
+            return changed
+
+    def on_write(self, table, rows, deleted):
+        # re-read through sync rather than trusting ``rows``: it also moves the
+        # watermark. Before the first full sync there is nothing to patch.
+        if self.ready:
+            self.sync([table])
+
+    def _watermark(self, conn, table):
+        row = conn.execute("SELECT watermark FROM sync_state WHERE table_name = ?", (table,)).fetchone()
+        return row[0] if row else None
+
+    def _sync_table(self, conn, table, full):
+        watermark = self._watermark(conn, table)
+        if full or watermark is None or table in self._full_only:
+            return self._reload(conn, table)
+        since = _shift(watermark, -REPLICA_SYNC_OVERLAP)
+        try:
+            rows = list(iter_changes(table, since))
+            gone = get_tombstones(table, since)
+        except SupabaseError as e:
+            if not _schema_missing(e):
+                raise
+            log.warning("⚠️ No change tracking for %s, reloading it in full each sync: %s", table, e)
+            self._full_only.add(table)
+            return self._reload(conn, table)
+        with conn:
+            changed = self._upsert(conn, table, rows)
+            ids = [int(t["row_id"]) for t in gone]
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                cur = conn.execute(f"DELETE FROM {table} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                changed += cur.rowcount
+            mark = _latest(watermark, *(_stamp(r) for r in rows), *(t["deleted_at"] for t in gone))
+            self._set_watermark(conn, table, mark)
+        return changed
+
+    def _reload(self, conn, table):
+        rows = list(iter_rows(table))
+        with conn:
+            changed = self._upsert(conn, table, rows)
+            keep = {int(r["id"]) for r in rows}
+            stale = [r[0] for r in conn.execute(f"SELECT id FROM {table}") if r[0] not in keep]
+            for start in range(0, len(stale), 500):
+                chunk = stale[start:start + 500]
+                conn.execute(f"DELETE FROM {table} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            changed += len(stale)
+            self._set_watermark(conn, table, _latest(*(_stamp(r) for r in rows)) or EPOCH)
+        return changed
+
+    def _upsert(self, conn, table, rows):
+        """Write the rows that differ from the stored copy; return how many did."""
+        columns = list(TABLES[table])
+        encoded = {}
+        for row in rows:
+            values = []
+            for c in columns:
+                v = row.get(c)
+                if c in JSON_COLUMNS and v is not None and not isinstance(v, str):
+                    v = json.dumps(v, sort_keys=True, separators=(",", ":"))
+                values.append(v)
+            encoded[int(row["id"])] = tuple(values)
+        # the sync overlap re-reads rows; unchanged ones must not look like writes
+        names = ", ".join(f'"{c}"' for c in columns)
+        ids = list(encoded)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            for stored in conn.execute(f"SELECT {names} FROM {table} "
+                                       f"WHERE id IN ({','.join('?' * len(chunk))})", chunk):
+                if encoded.get(stored[0]) == tuple(stored):
+                    del encoded[stored[0]]
+        if encoded:
+            # REPLACE also clears a row holding the same unique site_content key
+            conn.executemany(f"INSERT OR REPLACE INTO {table} ({names}) "
+                             f"VALUES ({','.join('?' * len(columns))})", list(encoded.values()))
+        return len(encoded)
+
+    def _set_watermark(self, conn, table, watermark):
+        conn.execute("INSERT OR REPLACE INTO sync_state (table_name, watermark, synced_at) VALUES (?, ?, ?)",
+                     (table, watermark, time.time()))
+
+    # ---------- BACKGROUND ----------
+    def start(self):
+        """Run the sync thread in this process (idempotent, fork-aware)."""
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+                return
+            self._worker_pid = pid
+            self._worker = threading.Thread(target=self._run, name="replica-sync", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        next_sync = 0.0
+        while True:
+            try:
+                self._poll_file()
+                if time.monotonic() >= next_sync:
+                    self.sync()
+                    next_sync = time.monotonic() + REPLICA_SYNC_INTERVAL
+            except Exception as e:
+                log.error("❌ Replica sync failed: %s", e)
+                next_sync = time.monotonic() + REPLICA_SYNC_INTERVAL
+            time.sleep(POLL_SECONDS)
+
+    def _poll_file(self):
+        # workers share the file; a commit by another one means our rendered
+        # pages may be stale even though our own sync found nothing new
+        version = self._conn().execute("PRAGMA data_version").fetchone()[0]
+        if self._seen_version is not None and version != self._seen_version:
+            data_changed(*TABLES)
+        self._seen_version = version
+
+    def stats(self):
+        conn = self._conn()
+        return {
+            "ready": self.ready,
+            "path": self.path,
+            "rows": {t: self.count(t) for t in TABLES},
+            "watermarks": {r[0]: r[1] for r in conn.execute("SELECT table_name, watermark FROM sync_state")},
+            "full_reload_tables": sorted(self._full_only),
+            "rows_applied": self.rows_applied,
+            "last_sync": self.last_sync,
+            "last_sync_seconds": self.last_sync_seconds,
+            "skipped_tables": self.skipped,
+        }
+
+
+def _keyset_where(order, values):
+    """SQL twin of supabase_db._keyset_filter: rows strictly after ``values``."""
+    col, desc = order[0]
+    op = "<" if desc else ">"
+    if len(order) == 1:
+        return f"{col} {op} ?", (values[0],)
+    col2, desc2 = order[1]
+    op2 = "<" if desc2 else ">"
+    return f"({col} {op} ? OR ({col} = ? AND {col2} {op2} ?))", (values[0], values[0], values[1])
+
+
+def init_app(app):
+    """Serve reads from the replica when REPLICA_ENABLED; returns it (or None)."""
+    if not REPLICA_ENABLED:
+        return None
+    try:
+        replica = Replica(REPLICA_PATH)
+    except (OSError, sqlite3.Error) as e:
+        log.warning("⚠️ Local replica disabled: %s", e)
+        return None
+    use_replica(replica)
+    on_write(replica.on_write)
+    app.extensions["replica"] = replica
+
+    @app.before_request
+    def _start_replica_sync():
+        replica.start()
+
+    return replica
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="reload every table instead of syncing changes")
+    parser.add_argument("--path", default=REPLICA_PATH)
+    args = parser.parse_args(argv)
+    replica = Replica(args.path)
+    changed = replica.sync(full=args.full)
+    print(f"✅ Replica synced: {changed} rows changed in {replica.last_sync_seconds}s "
+          f"({', '.join(f'{t}={n}' for t, n in replica.stats()['rows'].items())})")
+    if replica.skipped:
+        print(f"❌ Not synced (see the log): {', '.join(replica.skipped)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Blog post bodies rendered once, at write time, to sanitized HTML.
+
+    python richtext.py --backfill      # render content_html for older posts
+
+``add_blog``/``update_blog`` store ``render(content)`` in the row's
+``content_html`` column, and ``blog_post.html`` outputs that as is. No
+post is parsed on the request path.
+
+Content written with tags keeps an allowlist of formatting tags and
+attributes. Everything else is dropped: scripts and styles with their
+text, event handlers, and javascript:/data: URLs. Other unknown tags lose
+the tag but keep their text. Plain text becomes paragraphs: a blank line
+starts a new one, a single newline is a <br>.
+"""
+import argparse
+import html
+import re
+import sys
+from html.parser import HTMLParser
+
+ALLOWED_TAGS = {
+    "p", "br", "hr", "strong", "b", "em", "i", "u", "s", "small", "sub", "sup", "span",
+    "h2", "h3", "h4", "blockquote", "ul", "ol", "li", "a", "img", "figure", "figcaption",
+    "code", "pre", "table", "thead", "tbody", "tr", "th", "td",
+}
+ALLOWED_ATTRS = {
+    "a": {"href", "title"},
+    "img": {"src", "alt", "title", "width", "height"},
+    "th": {"colspan", "rowspan"},
+    "td": {"colspan", "rowspan"},
+}
+URL_ATTRS = {"href", "src"}
+SAFE_SCHEMES = {"http", "https", "mailto"}
+VOID_TAGS = {"br", "hr", "img"}
+DROP_WITH_TEXT = {"script", "style", "iframe", "object", "embed", "template", "noscript", "textarea", "select"}
+LOOKS_LIKE_HTML = re.compile(r"<\s*/?\s*[a-zA-Z][^>]*>")
+SCHEME = re.compile(r"^\s*([a-zA-Z][a-zA-Z0-9+.-]*):")
+
+
+def _safe_url(value):
+    # browsers ignore control characters and whitespace inside the scheme
+    cleaned = re.sub(r"[\x00-\x20]", "", value)
+    match = SCHEME.match(cleaned)
+    return match is None or match.group(1).lower() in SAFE_SCHEMES
+
+
+class _Sanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.open = []          # allowed tags still open, innermost last
+        self.skipping = 0       # depth inside a DROP_WITH_TEXT element
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_WITH_TEXT:
+            self.skipping += 1
+            return
+        if self.skipping or tag not in ALLOWED_TAGS:
+            return
+        kept = []
+        for name, value in attrs:
+            if name not in ALLOWED_ATTRS.get(tag, ()) or value is None:
+                continue
+            if name in URL_ATTRS and not _safe_url(value):
+                continue
+            kept.append(f' {name}="{html.escape(value)}"')
+        if tag == "a" and any(a.startswith(' href="http') for a in kept):
+            kept.append(' rel="nofollow noopener"')
+        if tag == "img":
+            kept.append(' loading="lazy" decoding="async"')
+        self.out.append(f"<{tag}{''.join(kept)}>")
+        if tag not in VOID_TAGS:
+            self.open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open and self.open[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_WITH_TEXT:
+            self.skipping = max(0, self.skipping - 1)
+            return
+        if self.skipping or tag not in self.open:
+            return
+        # close anything left open inside it, so the output stays balanced
+        while self.open:
+            inner = self.open.pop()
+            self.out.append(f"</{inner}>")
+            if inner == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.out.append(html.escape(data, quote=False))
+
+    def result(self):
+        self.close()
+        return "".join(self.out) + "".join(f"</{tag}>" for tag in reversed(self.open))
+
+
+def _paragraphs(text):
+    blocks = re.split(r"\n\s*\n", text.replace("\r\n", "\n").strip())
+    return "".join("<p>" + html.escape(block.strip(), quote=False).replace("\n", "<br>\n") + "</p>\n"
+                   for block in blocks if block.strip())
+
+
+def render(content):
+    """Sanitized HTML for a blog post body (HTML or plain text)."""
+    if not content:
+        return ""
+    if not LOOKS_LIKE_HTML.search(content):
+        return _paragraphs(content)
+    sanitizer = _Sanitizer()
+    sanitizer.feed(content)
+    return sanitizer.result()
+
+
+def backfill():
+    """Store content_html for every post written before it existed; return the count."""
+    from supabase_db import iter_rows, update_blog
+    done = 0
+    for row in list(iter_rows("blog_posts", select="id,content", where="content_html=is.null")):
+        if update_blog(row["id"], {"content_html": render(row.get("content"))}):
+            done += 1
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backfill", action="store_true", help="render content_html where it is missing")
+    args = parser.parse_args(argv)
+    if not args.backfill:
+        parser.print_help()
+        return 0
+    print(f"✅ Rendered {backfill()} blog posts")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
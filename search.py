@@ -0,0 +1,283 @@
+"""Full-text search over products and blog posts.
+
+Each worker keeps an in-memory SQLite FTS5 index of product name/short_desc
+and blog title/excerpt/content. It is built from Supabase once, on the
+first search. After that, every add/update/delete made through supabase_db
+patches it row by row via the write listener. Searches never touch the
+network; matching uses a prefix query per word, bm25 ranking (titles weigh
+more) and highlighted snippets.
+
+Each kind has its own FTS5 table, so a search for one kind never reads
+the other's rows, and prefix doclists are kept for prefixes of up to 10
+characters, so a prefix query streams one doclist instead of merging one
+per matching word. Only the newest SEARCH_CANDIDATES matches of each kind
+are ranked by bm25: a word found in every document costs the same as one
+found in a hundred. Words shorter than MIN_TERM_LENGTH are dropped, since
+a one-letter prefix matches nearly every row. Snippets are cut in Python
+for the rows shown rather than by FTS5's snippet(), which re-runs the
+match for every row. At 50,000 documents a search takes under 10 ms
+(bench/search_bench.py checks it).
+
+Writes made by other workers reach this index when it is older than
+SEARCH_MAX_AGE: the next search rebuilds it in the background and is
+answered from the current index meanwhile.
+"""
+import html
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from markupsafe import Markup, escape
+
+from config import SEARCH_CANDIDATES, SEARCH_MAX_AGE, SEARCH_LIMIT
+from supabase_db import iter_rows, on_write
+
+log = logging.getLogger(__name__)
+
+KINDS = ("product", "blog")
+TABLE_KIND = {"products": "product", "blog_posts": "blog"}
+# fields kept next to each document so results render without a fetch
+DISPLAY = {
+    "product": ("id", "name", "short_desc", "price", "image", "image_variants"),
+    "blog": ("id", "title", "excerpt", "image", "image_variants", "created_at"),
+}
+MAX_TERMS = 8
+MIN_TERM_LENGTH = 2
+# prefix lengths FTS5 keeps its own doclists for; a longer prefix is
+# answered by merging every matching term's doclist, which costs ms
+PREFIXES = "2 3 4 5 6 7 8 9 10"
+SNIPPET_WORDS = 24
+OPEN, CLOSE = "\x02", "\x03"
+TAGS = re.compile(r"<(script|style)\b.*?</\1\s*>|<[^>]+>", re.S | re.I)
+WORD = re.compile(r"\w+")
+
+
+def _table(kind):
+    return f"docs_{kind}"
+
+
+def _text(value):
+    return html.unescape(TAGS.sub(" ", value or ""))
+
+
+def _document(kind, row):
+    if kind == "product":
+        title, body = row.get("name"), row.get("short_desc")
+    else:
+        title = row.get("title")
+        body = f"{row.get('excerpt') or ''}\n{_text(row.get('content'))}"
+    data = {f: row.get(f) for f in DISPLAY[kind]}
+    return int(row["id"]), title or "", body or "", json.dumps(data)
+
+
+def _fold(word):
+    # what the unicode61 tokenizer compares: lower case, accents removed
+    if word.isascii():
+        return word.lower()
+    return "".join(c for c in unicodedata.normalize("NFKD", word.lower()) if not unicodedata.combining(c))
+
+
+def _terms(text):
+    folded = (_fold(t) for t in WORD.findall(text or ""))
+    return [t for t in folded if len(t) >= MIN_TERM_LENGTH][:MAX_TERMS]
+
+
+def match_query(text):
+    """User input -> FTS5 query: every word must match, each as a prefix.
+
+    Words shorter than MIN_TERM_LENGTH are left out.
+    """
+    return " ".join(f'"{t}"*' for t in _terms(text))
+
+
+def highlight(text, terms, words=None):
+    """Escape ``text`` and <mark> the words starting with a query term.
+
+    With ``words``, cut it to about that many words around the first match.
+    """
+    terms = tuple(terms)
+    begin, end = _window(text, terms, words) if words else (0, len(text))
+
+    def mark(m):
+        word = m.group()
+        return f"{OPEN}{word}{CLOSE}" if _fold(word).startswith(terms) else word
+
+    # mark with control characters, escape once, then swap in the tags
+    piece = WORD.sub(mark, text[begin:end].replace(OPEN, "").replace(CLOSE, ""))
+    marked = str(escape(piece)).replace(OPEN, "<mark>").replace(CLOSE, "</mark>")
+    return Markup(("…" if begin > 0 else "") + marked + ("…" if end < len(text) else ""))
+
+
+def _window(text, terms, words):
+    """(begin, end) offsets of ``words`` words of ``text`` around the first match."""
+    # a regex finds the match without tokenizing long posts (accented
+    # spellings just fall back to the start of the text)
+    found = re.search(r"\b(?:%s)" % "|".join(map(re.escape, terms)), text, re.I)
+    at = found.start() if found else 0
+    lead = words // 4                # words of context before the match
+    start = max(0, at - 16 * lead)
+    before = list(WORD.finditer(text, start, at))
+    if start > 0:
+        before = before[1:]          # the first one may be cut mid-word
+    if start == 0 and len(before) <= lead:
+        begin = 0
+    else:
+        before = before[-lead:]
+        begin = before[0].start() if before else at
+    end = len(text)
+    for count, m in enumerate(WORD.finditer(text, begin), 1):
+        if count == words:
+            end = m.end()
+            break
+    return begin, end
+
+
+class SearchIndex:
+    def __init__(self):
+        self._conn = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._pending = None        # writes seen while a rebuild is running
+        self._stale = False
+        self.built_at = None
+        self.documents = 0
+
+    # ---------- BUILD ----------
+    def _new_index(self):
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        for kind in KINDS:
+            conn.execute(f"CREATE VIRTUAL TABLE {_table(kind)} USING fts5("
+                         "title, body, data UNINDEXED, "
+                         f"prefix='{PREFIXES}', tokenize='unicode61 remove_diacritics 2')")
+        return conn
+
+    def build(self):
+        """Load every product and blog post into a fresh index and swap it in."""
+        with self._build_lock:
+            self._build()
+
+    def _build(self):
+        with self._lock:
+            self._pending = []
+        try:
+            conn = self._new_index()
+            for table, kind in TABLE_KIND.items():
+                docs = (_document(kind, row) for row in iter_rows(table, batch_size=1000))
+                conn.executemany(f"INSERT INTO {_table(kind)} (rowid, title, body, data) VALUES (?, ?, ?, ?)", docs)
+                conn.execute(f"INSERT INTO {_table(kind)} ({_table(kind)}) VALUES ('optimize')")
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self._stale = False
+            # replay writes that landed after iter_rows read past them
+            for table, rows, deleted in self._pending:
+                self._apply(conn, table, rows, deleted)
+            self._pending = None
+            self._conn = conn
+            self.built_at = time.monotonic()
+            self.documents = self._count(conn)
+
+    @staticmethod
+    def _count(conn):
+        return sum(conn.execute(f"SELECT COUNT(*) FROM {_table(k)}").fetchone()[0] for k in KINDS)
+
+    def _ensure_built(self):
+        if self._conn is None:
+            with self._build_lock:      # concurrent first searches share one build
+                if self._conn is None:
+                    self._build()
+        elif self._stale or time.monotonic() - self.built_at > SEARCH_MAX_AGE:
+            # answer from the current index while a fresh one loads
+            if self._build_lock.acquire(blocking=False):
+                threading.Thread(target=self._refresh, name="search-build", daemon=True).start()
+
+    def _refresh(self):
+        try:
+            self._build()
+        except Exception as e:
+            log.error("❌ Search index rebuild failed: %s", e)
+        finally:
+            self._build_lock.release()
+
+    # ---------- INCREMENTAL ----------
+    def on_write(self, table, rows, deleted):
+        if table not in TABLE_KIND:
+            return
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((table, rows, deleted))
+            if self._conn is not None:
+                self._apply(self._conn, table, rows, deleted)
+
+    def _apply(self, conn, table, rows, deleted):
+        kind = TABLE_KIND[table]
+        if rows is None and deleted is None:
+            self._stale = True      # a write we have no rows for: rebuild soon
+            return
+        ids = [r["id"] for r in rows or ()] + list(deleted or ())
+        conn.executemany(f"DELETE FROM {_table(kind)} WHERE rowid = ?", [(int(i),) for i in ids])
+        conn.executemany(f"INSERT INTO {_table(kind)} (rowid, title, body, data) VALUES (?, ?, ?, ?)",
+                         [_document(kind, r) for r in rows or ()])
+        self.documents = self._count(conn)
+
+    # ---------- QUERY ----------
+    def search(self, text, kind=None, limit=SEARCH_LIMIT):
+        """Best matches for ``text``: [{"kind", "id", "title", "snippet", "row"}]."""
+        terms = _terms(text)
+        if not terms:
+            return []
+        self._ensure_built()
+        query = match_query(text)
+        kinds = (kind,) if kind in KINDS else KINDS
+        with self._lock:
+            top = sorted(self._candidates(kinds, query))[:limit]
+            found = {}
+            for k in kinds:
+                ids = [rowid for _, k_, rowid in top if k_ == k]
+                if ids:
+                    sql = (f"SELECT rowid, title, body, data FROM {_table(k)} "
+                           f"WHERE rowid IN ({','.join('?' * len(ids))})")
+                    found.update(((k, r[0]), r[1:]) for r in self._conn.execute(sql, ids))
+        results = []
+        for _, k, rowid in top:
+            title, body, data = found[(k, rowid)]
+            row = json.loads(data)
+            results.append({"kind": k, "id": row["id"], "title": highlight(title, terms),
+                            "snippet": highlight(body, terms, SNIPPET_WORDS), "row": row})
+        return results
+
+    def _candidates(self, kinds, query):
+        """[(bm25, kind, rowid)] of the newest SEARCH_CANDIDATES matches of each kind."""
+        out = []
+        for k in kinds:
+            # ORDER BY rowid stops reading the doclists after the cap, so
+            # bm25 is only computed for that many rows
+            sql = (f"SELECT bm25({_table(k)}, 10.0, 1.0), rowid FROM {_table(k)} "
+                   f"WHERE {_table(k)} MATCH ? ORDER BY rowid DESC LIMIT ?")
+            out += [(score, k, rowid) for score, rowid in self._conn.execute(sql, (query, SEARCH_CANDIDATES))]
+        return out
+
+    def stats(self):
+        return {
+            "documents": self.documents,
+            "age_seconds": round(time.monotonic() - self.built_at, 1) if self.built_at else None,
+            "stale": self._stale,
+        }
+
+
+index = SearchIndex()
+on_write(index.on_write)
+
+
+def search(text, kind=None, limit=SEARCH_LIMIT):
+    try:
+        return index.search(text, kind, limit)
+    except Exception as e:
+        log.error("❌ Error searching: %s", e)
+        return []
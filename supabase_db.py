@@ -1,118 +1,1042 @@
-import requests
+import os
+import re
 import json
-from config import SUPABASE_URL, SUPABASE_KEY, HEADERS
+import math
+import base64
+import hashlib
+import time
+import logging
+import itertools
+import requests
+from urllib.parse import quote
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import (
+    SUPABASE_URL, SUPABASE_KEY, HEADERS,
+    SUPABASE_POOL_SIZE, SUPABASE_CONNECT_TIMEOUT, SUPABASE_READ_TIMEOUT,
+    SUPABASE_WRITE_TIMEOUT, SUPABASE_READ_RETRIES, SUPABASE_RETRY_BACKOFF,
+    SUPABASE_BREAKER_FAILURES, SUPABASE_BREAKER_RESET, BULK_BATCH_SIZE,
+    CACHE_TTL, CACHE_MAX_ENTRIES, CACHE_STALE_TTL, SNAPSHOT_DIR, SNAPSHOT_PAGES
+)
+from breaker import CircuitBreaker
+from cache import TTLCache, DiskSnapshots
+import metrics
+import richtext
+
+log = logging.getLogger(__name__)
 
 BUCKET = "uploads"
 
-def upload_to_supabase_storage(filename, file_bytes, content_type):
-    """Upload file bytes to Supabase Storage under profile_images/ and return public URL"""
-    # ✅ Store in a folder inside the bucket
-    path = f"profile_images/{filename}"
-    url = f"{SUPABASE_URL}/storage/v1/object/{BUCKET}/{path}"
+READ_TIMEOUT = (SUPABASE_CONNECT_TIMEOUT, SUPABASE_READ_TIMEOUT)
+WRITE_TIMEOUT = (SUPABASE_CONNECT_TIMEOUT, SUPABASE_WRITE_TIMEOUT)
 
-    headers = {
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "apikey": SUPABASE_KEY,
-        "Content-Type": content_type,
-        "x-upsert": "true"  # ✅ allows overwrite if file exists
-    }
 
-    res = requests.post(url, headers=headers, data=file_bytes)
+# ---------- HTTP CLIENT ----------
+# One keep-alive session per worker process, so every call after the first
+# reuses an open TCP+TLS connection to Supabase instead of handshaking again.
+_session = None
+_session_pid = None
+
+
+def _build_session():
+    # Only idempotent verbs are retried on read errors / 5xx; connect errors
+    # are retried for every verb because the request never left the box.
+    retry = Retry(
+        total=SUPABASE_READ_RETRIES,
+        connect=SUPABASE_READ_RETRIES,
+        read=SUPABASE_READ_RETRIES,
+        status=SUPABASE_READ_RETRIES,
+        backoff_factor=SUPABASE_RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=SUPABASE_POOL_SIZE, max_retries=retry)
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({"Connection": "keep-alive"})
+    return s
+
+
+def get_session():
+    """Return this worker's pooled session (rebuilt after a fork)."""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        _session = _build_session()
+        _session_pid = pid
+    return _session
+
+
+def _target(url):
+    """("rest" | "storage", table or storage operation) for metrics labels."""
+    path = url[len(SUPABASE_URL):].split("?", 1)[0]
+    if path.startswith("/rest/v1/"):
+        return "rest", path[len("/rest/v1/"):]
+    # /storage/v1/object/<bucket>/<path>, /object/list/<bucket>, /object/public/...
+    parts = path.split("/")
+    op = parts[4] if len(parts) > 4 and parts[4] in ("list", "public", "info", "sign") else "object"
+    return "storage", op
+
+
+# Shared by every call in this worker: once Supabase keeps failing, calls
+# raise BackendUnavailable at once and the cache answers with what it has.
+breaker = CircuitBreaker(SUPABASE_BREAKER_FAILURES, SUPABASE_BREAKER_RESET)
+
+
+def _request(method, url, headers=None, timeout=None, **kw):
+    if timeout is None:
+        timeout = READ_TIMEOUT if method in ("GET", "HEAD") else WRITE_TIMEOUT
+    if not breaker.allow():
+        metrics.backend_call(*_target(url), method, "circuit_open", 0.0)
+        raise BackendUnavailable(f"{method} {url}: Supabase circuit is open")
+    started = time.perf_counter()
+    status = "error"
+    try:
+        r = get_session().request(method, url, headers=headers or HEADERS, timeout=timeout, **kw)
+        status = r.status_code
+        return r
+    finally:
+        metrics.backend_call(*_target(url), method, status, time.perf_counter() - started)
+        # 4xx is our request being wrong, not Supabase being unhealthy
+        if status == "error" or status >= 500:
+            breaker.failure()
+        else:
+            breaker.success()
+
+
+def _rest(table, query=""):
+    return f"{SUPABASE_URL}/rest/v1/{table}" + (f"?{query}" if query else "")
+
+
+def _get(url, **kw):
+    return _request("GET", url, **kw)
+
+
+def _post(url, **kw):
+    return _request("POST", url, **kw)
+
+
+def _patch(url, **kw):
+    return _request("PATCH", url, **kw)
+
+
+def _delete(url, **kw):
+    return _request("DELETE", url, **kw)
+
+
+class SupabaseError(Exception):
+    """Raised inside loaders for a non-2xx answer so failures are never cached."""
+
+    def __init__(self, message, status=None, code=None):
+        super().__init__(message)
+        self.status = status
+        self.code = code            # PostgREST/Postgres error code from the body, if any
+
+
+class BackendUnavailable(SupabaseError):
+    """Raised instead of calling Supabase while the circuit breaker is open."""
+
+
+def _response_error(what, r):
+    """SupabaseError for the non-2xx response ``r`` to ``what``."""
+    try:
+        code = r.json().get("code")
+    except (ValueError, AttributeError):
+        code = None
+    return SupabaseError(f"{what} -> {r.status_code} {r.text[:200]}", r.status_code, code)
+
+
+def _fetch_json(url, **kw):
+    r = _get(url, **kw)
+    if r.status_code not in (200, 206):
+        raise _response_error(f"GET {url}", r)
+    return r.json()
+
+
+# ---------- CACHE ----------
+# Getters read through this cache; every write invalidates the keys it
+# touches so admins see their change on the next request. Each gunicorn
+# worker has its own cache, so other workers catch up within CACHE_TTL.
+# Expired entries are served while they refresh in the background. Their
+# last good value (kept on disk too) stands in while Supabase is down, so
+# the storefront shows slightly stale products rather than none.
+def _snapshot_worthy(key):
+    table, _, rest = key.partition(":")
+    if table not in ("products", "blog_posts", "site_content"):
+        return False
+    if rest.startswith("page:"):
+        # page:<select>:<limit>:<page>:<cursor>; keep the first pages only
+        *_, page, cursor = rest.split(":")
+        return not cursor and int(page) <= SNAPSHOT_PAGES
+    return True
+
+
+cache = TTLCache(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, stale_ttl=CACHE_STALE_TTL,
+                 snapshots=DiskSnapshots(SNAPSHOT_DIR, _snapshot_worthy) if SNAPSHOT_DIR else None)
+
+
+def cache_stats():
+    return {**cache.stats(), "breaker": breaker.stats()}
+
+
+# Bumped on every write so anything derived from the data (rendered pages,
+# ETags) can tell it is out of date without asking Supabase.
+_versions = itertools.count(1)
+_data_version = 0
+
+
+def data_version():
+    return _data_version
+
+
+def data_changed(*tables):
+    """Drop cached reads of ``tables`` and bump the data version."""
+    global _data_version
+    cache.invalidate(*tables)
+    _data_version = next(_versions)
+
+
+# Called as listener(table, rows, deleted) after every write made through
+# this module: ``rows`` are the inserted/updated rows as Supabase returned
+# them and ``deleted`` the removed ids; both are None when not known (the
+# local replica and the search index keep themselves current this way).
+_write_listeners = []
+
+
+def on_write(listener):
+    _write_listeners.append(listener)
+    return listener
+
+
+def _written(table, rows=None, deleted=None):
+    """Record a write: invalidate ``table`` and tell the write listeners."""
+    data_changed(table)
+    for listener in _write_listeners:
+        try:
+            listener(table, rows, deleted)
+        except Exception as e:
+            log.warning("⚠️ Write listener failed: %s", e)
+
+
+# ---------- LOCAL REPLICA ----------
+# When replica.py is enabled, reads are answered from its SQLite copy once
+# the first sync has finished; until then (or without it) they go to Supabase.
+_replica = None
+
+
+def use_replica(replica):
+    global _replica
+    _replica = replica
+
+
+def _local():
+    """The synced local replica, or None to read from Supabase."""
+    return _replica if _replica is not None and _replica.ready else None
+
+
+def _warm_row(table, row_id):
+    """``row_id`` from a fresh cached listing (page or full list) of detail rows, or None."""
+    for prefix in (f"{table}:page:", f"{table}:select:"):
+        for key, value in cache.fresh_items(prefix):
+            select = key[len(prefix):].split(":", 1)[0]
+            if select != "*" and not DETAIL_COLUMNS[table] <= set(select.split(",")):
+                continue
+            for row in value["items"] if isinstance(value, dict) else value:
+                if row.get("id") == row_id:
+                    return row
+    return None
+
+
+def _get_row(table, row_id):
+    """Single row by primary key: from a warm cached listing, else id=eq. with limit=1."""
+    row_id = int(row_id)
+    key = f"{table}:id:{row_id}"
+    row = cache.peek(key)
+    if row is None:
+        row = _warm_row(table, row_id)
+    if row is None:
+        try:
+            data = _fetch_json(_rest(table, f"id=eq.{row_id}&select=*&limit=1"))
+        except (requests.RequestException, SupabaseError):
+            row = cache.stale(key)      # last copy seen, if Supabase is failing
+            if row is None:
+                raise
+            return row
+        row = data[0] if data else None
+        # only hits are cached so probing random ids can't flush the cache
+        if row is not None:
+            cache.set(key, row)
+    return row
+
+
+# ---------- STORAGE ----------
+# Objects are stored under profile_images/<sha256>.<ext>: the name is the
+# content, so identical uploads share one object, nothing is ever
+# overwritten, and every public URL can be cached forever.
+UPLOAD_PREFIX = "profile_images"
+UPLOAD_CACHE_CONTROL = "max-age=31536000, immutable"
+CONTENT_ADDRESSED = re.compile(rf"/{UPLOAD_PREFIX}/[0-9a-f]{{64}}\.[a-z0-9]+$")
+
+# paths this worker recently saw in the bucket (skips the HEAD). Objects
+# can be removed (remove_unused_images), so other workers only trust an
+# entry for CACHE_TTL, the same lag they have for rows.
+_stored_objects = {}
 
-    if res.status_code == 409:
-        print("⚠️ File already exists in storage, skipping upload.")
 
+def _known_stored(path):
+    seen = _stored_objects.get(path)
+    return seen is not None and time.monotonic() - seen < CACHE_TTL
+
+
+def _remember_stored(path):
+    _stored_objects[path] = time.monotonic()
+
+
+def _storage_headers(**extra):
+    return {"Authorization": f"Bearer {SUPABASE_KEY}", "apikey": SUPABASE_KEY, **extra}
+
+
+def public_url(path):
+    return f"{SUPABASE_URL}/storage/v1/object/public/{BUCKET}/{path}"
+
+
+def _path_for(digest, filename):
+    ext = os.path.splitext(filename)[1].lower().lstrip(".") or "bin"
+    return f"{UPLOAD_PREFIX}/{digest}.{ext}"
+
+
+def content_path(file_bytes, filename):
+    """Bucket path for ``file_bytes``: profile_images/<sha256>.<ext>."""
+    return _path_for(hashlib.sha256(file_bytes).hexdigest(), filename)
+
+
+def storage_object_exists(path):
+    try:
+        r = _request("HEAD", public_url(path), headers=_storage_headers())
+        return r.status_code == 200
+    except Exception as e:
+        log.warning("⚠️ Could not check storage object: %s", e)
+        return False
+
+
+def _store_object(path, body, content_type, size=None):
+    """POST ``body`` (bytes or a file object) to ``path`` unless it is already stored."""
+    if _known_stored(path) or storage_object_exists(path):
+        _remember_stored(path)
+        return public_url(path)
+
+    url = f"{SUPABASE_URL}/storage/v1/object/{BUCKET}/{path}"
+    headers = _storage_headers(**{
+        "Content-Type": content_type,
+        "cache-control": UPLOAD_CACHE_CONTROL,
+        "x-upsert": "false"  # same name means same bytes, never overwrite
+    })
+    if size is not None:
+        headers["Content-Length"] = str(size)
+
+    try:
+        res = _post(url, headers=headers, data=body)
+    except Exception as e:
+        log.error("❌ Upload failed: %s", e)
+        return None
+
+    # 409: someone stored these exact bytes between our HEAD and POST
     if res.status_code in (200, 201, 409):
-        public_url = f"{SUPABASE_URL}/storage/v1/object/public/{BUCKET}/{path}"
-        return public_url
+        _remember_stored(path)
+        return public_url(path)
     else:
-        print("❌ Upload failed:", res.status_code, res.text)
+        log.error("❌ Upload failed: %s %s", res.status_code, res.text)
+        return None
+
+
+def upload_to_supabase_storage(filename, file_bytes, content_type):
+    """Upload file bytes to Supabase Storage and return the immutable public URL.
+
+    ``filename`` only supplies the extension; the object name is the SHA-256
+    of the bytes, and bytes the bucket already has are not sent again.
+    """
+    return _store_object(content_path(file_bytes, filename), file_bytes, content_type)
+
+
+def upload_stream_to_supabase_storage(open_file, filename, content_type, size=None):
+    """Like upload_to_supabase_storage, without holding the file in memory.
+
+    ``open_file()`` must return a fresh binary file object each call: one
+    pass hashes it in chunks, a second streams it as the request body.
+    """
+    digest = hashlib.sha256()
+    with open_file() as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    path = _path_for(digest.hexdigest(), filename)
+    if _known_stored(path):
+        return public_url(path)
+    with open_file() as f:
+        return _store_object(path, f, content_type, size)
+
+
+def object_path(url):
+    """Bucket path behind one of our content-addressed public URLs, else None."""
+    prefix = public_url("")
+    if url and url.startswith(prefix) and CONTENT_ADDRESSED.search(url):
+        return url[len(prefix):]
+    return None
+
+
+def image_urls(row):
+    """``image`` plus every variant URL of a product/blog row."""
+    urls = [row.get("image")]
+    variants = row.get("image_variants") or {}
+    if isinstance(variants, str):
+        variants = json.loads(variants)
+    for by_width in variants.values():
+        urls += by_width.values()
+    return [u for u in urls if u]
+
+
+def remove_unused_images(rows):
+    """Delete the stored images of deleted ``rows`` that no remaining row uses.
+
+    Identical uploads share one object (and one set of variants), so an
+    image another product or post still shows is kept. The rest go in one
+    Storage request. Returns the number of objects removed.
+    """
+    candidates = {row["image"]: image_urls(row) for row in rows if object_path(row.get("image"))}
+    if not candidates:
+        return 0
+    in_use = set()
+    # quoted URLs are long; keep each image=in.(...) query a sane length
+    for table in ("products", "blog_posts"):
+        for chunk in _chunks(list(candidates), 50):
+            data = _fetch_json(_rest(table, f"select=image&image=in.{_in_list(chunk)}"))
+            in_use.update(r["image"] for r in data)
+    paths = sorted({object_path(url) for image, urls in candidates.items() if image not in in_use
+                    for url in urls} - {None})
+    return remove_storage_objects(paths) if paths else 0
+
+
+def remove_storage_objects(paths):
+    """Delete bucket ``paths`` in one Storage request; return how many existed."""
+    for path in paths:
+        _stored_objects.pop(path, None)
+    r = _delete(f"{SUPABASE_URL}/storage/v1/object/{BUCKET}",
+                headers=_storage_headers(**{"Content-Type": "application/json"}), json={"prefixes": list(paths)})
+    if r.status_code != 200:
+        raise SupabaseError(f"DELETE {len(paths)} storage objects -> {r.status_code} {r.text[:200]}")
+    return len(r.json())
+
+
+def list_storage_objects(prefix=UPLOAD_PREFIX, batch_size=1000):
+    """Yield ``(path, info)`` for every object under ``prefix``, one list request per batch.
+
+    The Storage list API only pages by offset, so don't delete under
+    ``prefix`` while iterating.
+    """
+    url = f"{SUPABASE_URL}/storage/v1/object/list/{BUCKET}"
+    headers = _storage_headers(**{"Content-Type": "application/json"})
+    offset = 0
+    while True:
+        r = _post(url, headers=headers, json={"prefix": prefix, "limit": batch_size, "offset": offset,
+                                               "sortBy": {"column": "name", "order": "asc"}})
+        if r.status_code != 200:
+            raise SupabaseError(f"list {BUCKET}/{prefix} -> {r.status_code} {r.text[:200]}")
+        items = r.json()
+        for item in items:
+            if item.get("id") is not None:      # sub-folders come back without an id
+                yield f"{prefix}/{item['name']}", item
+        if len(items) < batch_size:
+            return
+        offset += batch_size
+
+
+# ---------- PAGINATION ----------
+# Listings are read a page at a time with limit/order and a keyset cursor
+# (the last row's sort values), so a page costs the same on row 10 as on
+# row 10,000. Range + Prefer: count=exact gives the total for the pager.
+PRODUCT_ORDER = (("id", False),)
+BLOG_ORDER = (("created_at", True), ("id", True))
+
+# Columns the list views show (cards, admin lists). Detail views fetch the
+# whole row; the list never downloads blog bodies.
+PRODUCT_LIST_COLUMNS = "id,name,short_desc,price,image,image_variants,created_at"
+BLOG_LIST_COLUMNS = "id,title,excerpt,image,image_variants,created_at"
+# what a detail view reads; cached listings selecting all of it answer
+# single-row reads too (product cards carry every product column)
+DETAIL_COLUMNS = {
+    "products": frozenset(PRODUCT_LIST_COLUMNS.split(",")),
+    "blog_posts": frozenset(BLOG_LIST_COLUMNS.split(",")) | {"content", "content_html"},
+}
+
+
+def _encode_cursor(row, order):
+    raw = json.dumps([row.get(col) for col, _ in order], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor, order):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
         return None
+    if not isinstance(values, list) or len(values) != len(order) or None in values:
+        return None
+    return values
+
+
+def cursor_values(cursor, order=PRODUCT_ORDER):
+    """Sort values of the row a Next-page ``cursor`` resumes after, or None."""
+    return _decode_cursor(cursor, order) if cursor else None
+
+
+def _keyset_filter(order, values):
+    """PostgREST filter selecting rows strictly after ``values`` in ``order``."""
+    def op(desc):
+        return "lt" if desc else "gt"
+
+    def val(v):
+        return quote(str(v), safe="")
+
+    col, desc = order[0]
+    if len(order) == 1:
+        return f"{col}={op(desc)}.{val(values[0])}"
+    col2, desc2 = order[1]
+    return (f"or=({col}.{op(desc)}.{val(values[0])},"
+            f"and({col}.eq.{val(values[0])},{col2}.{op(desc2)}.{val(values[1])}))")
+
+
+def _fetch_page(table, order, limit, cursor, page, select, where=None):
+    offset = (page - 1) * limit
+    values = _decode_cursor(cursor, order) if cursor else None
+    query = [f"select={select}",
+             "order=" + ",".join(f"{col}.{'desc' if desc else 'asc'}" for col, desc in order)]
+    if where:
+        query.append(where)
+    if values is not None:
+        query.append(_keyset_filter(order, values))
+        skip = 0
+    else:
+        skip = offset
+    headers = {**HEADERS, "Range-Unit": "items", "Range": f"{skip}-{skip + limit - 1}",
+               "Prefer": "count=exact"}
+    r = _get(_rest(table, "&".join(query)), headers=headers)
+    if r.status_code == 416:        # asked for a range past the end
+        rows, remaining = [], 0
+    elif r.status_code in (200, 206):
+        rows = r.json()
+        remaining = _content_range_total(r.headers.get("Content-Range"))
+        if remaining is not None and values is None:
+            remaining -= skip
+    else:
+        raise _response_error(f"GET {table} page", r)
+
+    # with a cursor the count only covers rows after it
+    total = offset + remaining if remaining is not None else offset + len(rows)
+    return _page_result(rows, order, limit, page, total)
+
+
+def _page_result(rows, order, limit, page, total):
+    offset = (page - 1) * limit
+    has_next = len(rows) == limit and offset + len(rows) < total
+    return {
+        "items": rows,
+        "page": page,
+        "limit": limit,
+        "total": total,
+        "pages": max(1, math.ceil(total / limit)),
+        "next_cursor": _encode_cursor(rows[-1], order) if has_next else None,
+    }
+
+
+def _content_range_total(header):
+    # "0-23/4096" or "*/0"; "*" total means the server didn't count
+    if not header or "/" not in header:
+        return None
+    total = header.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
+
+
+def _get_page(table, order, limit, cursor=None, page=1, select="*"):
+    page = max(1, int(page or 1))
+    key = f"{table}:page:{select}:{limit}:{page}:{cursor or ''}"
+    return cache.get_or_load(key, lambda: _fetch_page(table, order, limit, cursor, page, select))
+
+
+def _count(table):
+    """Row count from a HEAD request with Prefer: count=exact (no rows sent)."""
+    def load():
+        headers = {**HEADERS, "Prefer": "count=exact"}
+        r = _request("HEAD", _rest(table, "select=id"), headers=headers)
+        total = _content_range_total(r.headers.get("Content-Range"))
+        if r.status_code not in (200, 206) or total is None:
+            raise SupabaseError(f"HEAD {table} count -> {r.status_code}")
+        return total
+
+    return cache.get_or_load(f"{table}:count", load)
+
+
+def iter_pages(table, batch_size=500, select="*", where=None, order=(("id", False),)):
+    """Yield the rows of ``table`` (matching ``where``) as lists, one keyset page per request.
+
+    Bypasses the cache; meant for scripts and maintenance jobs. Rows of a
+    page already yielded may be deleted or changed before the next one is
+    fetched: it starts after the last row's sort values, not at an offset.
+    """
+    cursor, page = None, 1
+    while True:
+        result = _fetch_page(table, order, batch_size, cursor, page, select, where)
+        if result["items"]:
+            yield result["items"]
+        cursor = result["next_cursor"]
+        if not cursor:
+            return
+        page += 1
+
+
+def iter_rows(table, batch_size=500, select="*", where=None, order=(("id", False),)):
+    """Yield every row of ``table`` (matching ``where``), one keyset page per request."""
+    for rows in iter_pages(table, batch_size, select, where, order):
+        yield from rows
+
+
+CHANGE_ORDER = (("updated_at", False), ("id", False))
+
+
+def iter_changes(table, since, batch_size=500):
+    """Yield rows of ``table`` inserted or updated at or after ``since`` (ISO timestamp).
+
+    Needs the updated_at column from migrations/002_replica_sync.sql.
+    """
+    return iter_rows(table, batch_size, where=f"updated_at=gte.{quote(since, safe='')}",
+                     order=CHANGE_ORDER)
+
+
+def get_tombstones(table, since):
+    """[{"row_id", "deleted_at"}] for rows of ``table`` deleted at or after ``since``."""
+    return _fetch_json(_rest("deleted_rows", f"select=row_id,deleted_at&table_name=eq.{table}"
+                                             f"&deleted_at=gte.{quote(since, safe='')}&order=deleted_at.asc"))
+
+
+def _empty_page(limit, page):
+    return {"items": [], "page": max(1, int(page or 1)), "limit": limit,
+            "total": 0, "pages": 1, "next_cursor": None}
 
 
 # ---------- PRODUCTS ----------
-def get_all_products():
+def _list_key(table, select):
+    return f"{table}:select:{select}"
+
+
+def get_all_products(select=PRODUCT_LIST_COLUMNS):
     try:
-        r = requests.get(f"{SUPABASE_URL}/rest/v1/products?select=*", headers=HEADERS, timeout=10)
-        return r.json() if r.status_code in (200, 206) else []
+        local = _local()
+        if local:
+            return local.all_rows("products", select)
+        return cache.get_or_load(_list_key("products", select),
+                                 lambda: _fetch_json(_rest("products", f"select={select}")))
     except Exception as e:
-        print("❌ Error fetching products:", e)
+        log.error("❌ Error fetching products: %s", e)
         return []
 
 
-def add_product(name, short_desc, price, image_url):
+def get_products_page(limit=24, cursor=None, page=1, select=PRODUCT_LIST_COLUMNS):
+    """One page of products ordered by id; see _fetch_page for the result shape."""
+    try:
+        local = _local()
+        if local:
+            return local.page("products", PRODUCT_ORDER, limit, cursor, page, select)
+        return _get_page("products", PRODUCT_ORDER, limit, cursor, page, select)
+    except Exception as e:
+        log.error("❌ Error fetching products page: %s", e)
+        return _empty_page(limit, page)
+
+
+def count_products():
+    try:
+        local = _local()
+        return local.count("products") if local else _count("products")
+    except Exception as e:
+        log.error("❌ Error counting products: %s", e)
+        return 0
+
+
+def get_product(pid):
+    try:
+        local = _local()
+        return local.get_row("products", pid) if local else _get_row("products", pid)
+    except Exception as e:
+        log.error("❌ Error fetching product: %s", e)
+        return None
+
+
+def _insert(table, data):
+    """POST one row and return it as stored (with id), or None on failure."""
+    headers = {**HEADERS, "Prefer": "return=representation"}
+    r = _post(_rest(table), headers=headers, json=data)
+    if r.status_code not in (200, 201):
+        _written(table)
+        log.error("❌ Insert into %s failed: %s %s", table, r.status_code, r.text)
+        return None
+    rows = r.json()
+    _written(table, rows=rows)
+    return rows[0] if rows else None
+
+
+def _update(table, row_id, fields):
+    headers = {**HEADERS, "Prefer": "return=representation"}
+    r = _patch(_rest(table, f"id=eq.{int(row_id)}"), headers=headers, json=fields)
+    _written(table, rows=r.json() if r.status_code == 200 else None)
+    if r.status_code not in (200, 204):
+        log.error("❌ Update of %s %s failed: %s %s", table, row_id, r.status_code, r.text)
+    return r.status_code in (200, 204)
+
+
+# ---------- BULK WRITES ----------
+# Admin bulk actions send one request per BULK_BATCH_SIZE ids, with an
+# id=in.(...) filter, instead of one per row.
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _id_batches(ids):
+    return _chunks(sorted({int(i) for i in ids}), BULK_BATCH_SIZE)
+
+
+def _ids_filter(ids):
+    return "id=in.(" + ",".join(str(i) for i in ids) + ")"
+
+
+def _update_groups(table, groups):
+    """PATCH each ``(ids, fields)`` group; return the updated rows (None on failure).
+
+    Ids that no longer exist match nothing, so they are skipped, never re-created.
+    """
+    headers = {**HEADERS, "Prefer": "return=representation"}
+    updated = []
+    try:
+        for ids, fields in groups:
+            for batch in _id_batches(ids):
+                r = _patch(_rest(table, _ids_filter(batch)), headers=headers, json=fields)
+                if r.status_code != 200:
+                    log.error("❌ Bulk update of %s failed: %s %s", table, r.status_code, r.text[:500])
+                    return None
+                updated += r.json()
+        return updated
+    finally:
+        _written(table, rows=updated)
+
+
+def _update_many(table, ids, fields):
+    """PATCH ``fields`` onto every row in ``ids``; return the updated rows (None on failure)."""
+    return _update_groups(table, [(ids, fields)])
+
+
+def _delete_many(table, ids):
+    """DELETE every row in ``ids``; return the deleted rows (None on failure)."""
+    headers = {**HEADERS, "Prefer": "return=representation"}
+    deleted = []
+    try:
+        for batch in _id_batches(ids):
+            r = _delete(_rest(table, _ids_filter(batch)), headers=headers)
+            if r.status_code != 200:
+                log.error("❌ Bulk delete from %s failed: %s %s", table, r.status_code, r.text[:500])
+                return None
+            deleted += r.json()
+        return deleted
+    finally:
+        _written(table, deleted=[int(row["id"]) for row in deleted])
+
+
+def _delete_with_images(table, ids):
+    rows = _delete_many(table, ids)
+    if rows:
+        try:
+            remove_unused_images(rows)
+        except Exception as e:
+            # the rows are gone either way; maintenance can sweep the objects
+            log.warning("⚠️ Could not remove images of deleted %s: %s", table, e)
+    return rows
+
+
+def add_product(name, short_desc, price, image_url, image_variants=None):
+    """Insert a product and return the new row (falsy on failure)."""
     data = {"name": name, "short_desc": short_desc, "price": price, "image": image_url}
+    if image_variants:
+        data["image_variants"] = image_variants
     try:
-        r = requests.post(f"{SUPABASE_URL}/rest/v1/products", headers=HEADERS, data=json.dumps(data))
-        return r.status_code in (200, 201)
+        return _insert("products", data)
     except Exception as e:
-        print("❌ Error adding product:", e)
+        log.error("❌ Error adding product: %s", e)
         return False
 
 
-def delete_product(pid):
+def add_products(rows):
+    """Insert many products in one array POST; return the created rows (None on failure)."""
+    if not rows:
+        return []
+    columns = ("name", "short_desc", "price", "image")
+    # PostgREST wants every object in a bulk insert to have the same keys
+    data = [{c: row.get(c) for c in columns} for row in rows]
+    headers = {**HEADERS, "Prefer": "return=representation"}
     try:
-        r = requests.delete(f"{SUPABASE_URL}/rest/v1/products?id=eq.{pid}", headers=HEADERS)
-        return r.status_code in (200, 204)
+        r = _post(_rest("products", "columns=" + ",".join(columns)), headers=headers, json=data)
+        if r.status_code not in (200, 201):
+            _written("products")
+            log.error("❌ Bulk insert into products failed: %s %s", r.status_code, r.text[:500])
+            return None
+        created = r.json()
+        _written("products", rows=created)
+        return created
     except Exception as e:
-        print("❌ Error deleting product:", e)
+        log.error("❌ Error adding products: %s", e)
+        return None
+
+
+def update_product(pid, fields):
+    try:
+        return _update("products", pid, fields)
+    except Exception as e:
+        log.error("❌ Error updating product: %s", e)
         return False
 
 
+def update_products(ids, fields):
+    """Apply the same ``fields`` to many products; return the updated rows (None on failure)."""
+    try:
+        return _update_many("products", ids, fields)
+    except Exception as e:
+        log.error("❌ Error updating products: %s", e)
+        return None
+
+
+def set_product_prices(prices):
+    """Write ``{id: price}`` with one id=in.(...) PATCH per distinct price; return the updated rows (None on failure)."""
+    by_price = {}
+    for pid, price in prices.items():
+        by_price.setdefault(price, []).append(pid)
+    try:
+        return _update_groups("products", [(ids, {"price": price}) for price, ids in by_price.items()])
+    except Exception as e:
+        log.error("❌ Error updating product prices: %s", e)
+        return None
+
+
+def adjust_product_prices(ids, percent):
+    """Change the price of many products by ``percent``; return the updated rows (None on failure)."""
+    try:
+        current = []
+        for batch in _id_batches(ids):
+            current += _fetch_json(_rest("products", f"select=id,price&{_ids_filter(batch)}"))
+    except Exception as e:
+        log.error("❌ Error fetching product prices: %s", e)
+        return None
+    factor = 1 + percent / 100
+    return set_product_prices({row["id"]: round(max(0.0, (row["price"] or 0) * factor), 2) for row in current})
+
+
+def delete_products(ids):
+    """Delete many products and their now-unused images; return the deleted rows (None on failure)."""
+    try:
+        return _delete_with_images("products", ids)
+    except Exception as e:
+        log.error("❌ Error deleting products: %s", e)
+        return None
+
+
+def delete_product(pid):
+    return delete_products([pid]) is not None
+
+
 # ---------- BLOGS ----------
-def get_all_blogs():
+def get_all_blogs(select=BLOG_LIST_COLUMNS):
     try:
-        r = requests.get(f"{SUPABASE_URL}/rest/v1/blog_posts?select=*", headers=HEADERS, timeout=10)
-        return r.json() if r.status_code in (200, 206) else []
+        local = _local()
+        if local:
+            return local.all_rows("blog_posts", select)
+        return cache.get_or_load(_list_key("blog_posts", select),
+                                 lambda: _fetch_json(_rest("blog_posts", f"select={select}")))
     except Exception as e:
-        print("❌ Error fetching blogs:", e)
+        log.error("❌ Error fetching blogs: %s", e)
         return []
 
 
-def add_blog(title, excerpt, content, image_url):
-    data = {"title": title, "excerpt": excerpt, "content": content, "image": image_url}
+def get_blogs_page(limit=12, cursor=None, page=1, select=BLOG_LIST_COLUMNS):
+    """One page of blog posts, newest first (list columns only by default)."""
     try:
-        r = requests.post(f"{SUPABASE_URL}/rest/v1/blog_posts", headers=HEADERS, data=json.dumps(data))
-        return r.status_code in (200, 201)
+        local = _local()
+        if local:
+            return local.page("blog_posts", BLOG_ORDER, limit, cursor, page, select)
+        return _get_page("blog_posts", BLOG_ORDER, limit, cursor, page, select)
     except Exception as e:
-        print("❌ Error adding blog:", e)
+        log.error("❌ Error fetching blogs page: %s", e)
+        return _empty_page(limit, page)
+
+
+def count_blogs():
+    try:
+        local = _local()
+        return local.count("blog_posts") if local else _count("blog_posts")
+    except Exception as e:
+        log.error("❌ Error counting blogs: %s", e)
+        return 0
+
+
+def get_blog(bid):
+    """Full blog post row, with ``content_html`` ready to output."""
+    try:
+        local = _local()
+        row = local.get_row("blog_posts", bid) if local else _get_row("blog_posts", bid)
+        if row is not None and row.get("content_html") is None:
+            # written before content_html existed (see richtext.py --backfill);
+            # a cached row keeps the result
+            row["content_html"] = richtext.render(row.get("content"))
+        return row
+    except Exception as e:
+        log.error("❌ Error fetching blog: %s", e)
+        return None
+
+
+def add_blog(title, excerpt, content, image_url, image_variants=None):
+    """Insert a blog post and return the new row (falsy on failure)."""
+    data = {"title": title, "excerpt": excerpt, "content": content,
+            "content_html": richtext.render(content), "image": image_url}
+    if image_variants:
+        data["image_variants"] = image_variants
+    try:
+        return _insert("blog_posts", data)
+    except Exception as e:
+        log.error("❌ Error adding blog: %s", e)
         return False
 
 
-def delete_blog(bid):
+def update_blog(bid, fields):
+    if "content" in fields:
+        fields = {**fields, "content_html": richtext.render(fields["content"])}
     try:
-        r = requests.delete(f"{SUPABASE_URL}/rest/v1/blog_posts?id=eq.{bid}", headers=HEADERS)
-        return r.status_code in (200, 204)
+        return _update("blog_posts", bid, fields)
     except Exception as e:
-        print("❌ Error deleting blog:", e)
+        log.error("❌ Error updating blog: %s", e)
         return False
 
-def get_site_content(key):
+
+def update_blogs(ids, fields):
+    """Apply the same ``fields`` to many blog posts; return the updated rows (None on failure)."""
+    if "content" in fields:
+        fields = {**fields, "content_html": richtext.render(fields["content"])}
     try:
-        r = requests.get(
-            f"{SUPABASE_URL}/rest/v1/site_content?key=eq.{key}&select=value",
-            headers=HEADERS,
-            timeout=10
-        )
+        return _update_many("blog_posts", ids, fields)
+    except Exception as e:
+        log.error("❌ Error updating blogs: %s", e)
+        return None
+
 
-        data = r.json()
-        return data[0]['value'] if data else None
+def republish_blogs(ids):
+    """Move many posts to the top of the blog (created_at = now); return the updated rows (None on failure)."""
+    return update_blogs(ids, {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())})
 
+
+def delete_blogs(ids):
+    """Delete many blog posts and their now-unused images; return the deleted rows (None on failure)."""
+    try:
+        return _delete_with_images("blog_posts", ids)
     except Exception as e:
-        print("❌ Error in get_site_content:", e)
+        log.error("❌ Error deleting blogs: %s", e)
         return None
 
 
+def delete_blog(bid):
+    return delete_blogs([bid]) is not None
+
+
+# ---------- SITE CONTENT ----------
+# All site_content rows are small, so they are loaded together as one
+# key -> value snapshot; single-key reads are answered from it.
+def _in_list(values):
+    return "(" + ",".join('"' + str(v).replace('"', '\\"') + '"' for v in values) + ")"
+
+
+def get_all_site_content():
+    """Snapshot of every site_content row as {key: value} (one request per TTL)."""
+    def load():
+        rows = _fetch_json(_rest("site_content", "select=key,value"))
+        return {row['key']: row['value'] for row in rows}
+
+    try:
+        local = _local()
+        if local:
+            return local.site_content()
+        return cache.get_or_load("site_content", load)
+    except Exception as e:
+        log.error("❌ Error in get_all_site_content: %s", e)
+        return {}
+
+
+def get_site_contents(keys):
+    """{key: value} for ``keys`` using one key=in.(...) query (or the warm snapshot)."""
+    keys = list(keys)
+    local = _local()
+    snapshot = local.site_content() if local else cache.peek("site_content")
+    if snapshot is not None:
+        return {k: snapshot[k] for k in keys if k in snapshot}
+    if not keys:
+        return {}
+    try:
+        rows = _fetch_json(_rest("site_content", f"key=in.{quote(_in_list(keys), safe='(),')}&select=key,value"))
+        return {row['key']: row['value'] for row in rows}
+    except Exception as e:
+        log.error("❌ Error in get_site_contents: %s", e)
+        return {}
+
+
+def get_site_content(key):
+    return get_all_site_content().get(key)
+
 
 def add_site_content(key, value):
-    """Insert row if missing (used during app init)."""
+    """Insert a row for a key that doesn't exist yet."""
     data = {"key": key, "value": value}
     try:
-        r = requests.post(f"{SUPABASE_URL}/rest/v1/site_content", headers=HEADERS, data=json.dumps(data), timeout=10)
-        print("🔹 add_site_content ->", r.status_code, r.text)
+        r = _post(_rest("site_content"), json=data)
+        _written("site_content")
+        log.debug("🔹 add_site_content -> %s %s", r.status_code, r.text)
         return r.status_code in (201, 200)
     except Exception as e:
-        print("❌ Error in add_site_content:", e)
+        log.error("❌ Error in add_site_content: %s", e)
+        return False
+
+
+def _upsert_site_contents(values, resolution):
+    if not values:
+        return True
+    rows = [{"key": k, "value": v} for k, v in values.items()]
+    headers = {**HEADERS, "Prefer": f"resolution={resolution},return=minimal"}
+    r = _post(_rest("site_content", "on_conflict=key"), headers=headers, json=rows)
+    _written("site_content")
+    log.debug("🔹 site_content upsert (%s) -> %s %s", resolution, r.status_code, r.text)
+    return r.status_code in (201, 200, 204)
+
+
+def add_site_contents(values):
+    """Insert every {key: value} pair that doesn't exist yet in one request.
+
+    Existing keys are left untouched (on_conflict=key + ignore-duplicates),
+    so this is safe to run for seeding defaults.
+    """
+    try:
+        return _upsert_site_contents(values, "ignore-duplicates")
+    except Exception as e:
+        log.error("❌ Error in add_site_contents: %s", e)
+        return False
+
+
+def save_site_contents(values):
+    """Write every {key: value} pair in one request, inserting missing keys."""
+    try:
+        return _upsert_site_contents(values, "merge-duplicates")
+    except Exception as e:
+        log.error("❌ Error in save_site_contents: %s", e)
         return False
 
 
@@ -120,17 +1044,13 @@ def update_site_content(key, value):
     try:
         payload = {"value": value}
 
-        r = requests.patch(
-            f"{SUPABASE_URL}/rest/v1/site_content?key=eq.{key}",
-            headers={**HEADERS, "Content-Type": "application/json"},
-            json=payload,
-            timeout=10
-        )
+        r = _patch(_rest("site_content", f"key=eq.{key}"), json=payload)
+        _written("site_content")
 
-        print("🔹 update_site_content ->", r.status_code, r.text)
+        log.debug("🔹 update_site_content -> %s %s", r.status_code, r.text)
 
         return r.status_code in (200, 204)
 
     except Exception as e:
-        print("❌ Error in update_site_content:", e)
+        log.error("❌ Error in update_site_content: %s", e)
         return False
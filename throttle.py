@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """``rate`` tokens per second, up to ``burst`` saved; each attempt takes one."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def wait(self, now):
+        """Seconds until a token is available (0 if one is now), without taking it."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        """Take a token; return 0 on success, else seconds until one is available."""
+        wait = self.wait(now)
+        if not wait:
+            self.tokens -= 1
+        return wait
+
+
+class _Client:
+    __slots__ = ("bucket", "failures", "locked_until", "last_failure")
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.failures = 0
+        self.locked_until = 0.0
+        self.last_failure = 0.0
+
+
+class LoginThrottle:
+    """Decide cheaply whether a login attempt may run the password hash.
+
+    Each client IP has a token bucket (``rate`` attempts per second,
+    ``burst`` at once), and all IPs share one more (``global_rate``,
+    ``global_burst``) against floods from many addresses. After
+    ``lockout_after`` failed passwords in a row, an IP is locked out for
+    ``lockout_base`` seconds. The lockout doubles with every further
+    failure, up to ``lockout_max``, and is forgotten ``lockout_max`` after
+    the last failure or on a successful login. At most ``max_clients`` IPs
+    are remembered (least recently seen go first), so spoofed addresses
+    can't grow memory.
+
+    Attempts that pass still queue for one of ``hash_slots`` slots before
+    the hash runs, and give up after ``hash_wait`` seconds. That keeps a
+    burst of checks from holding every worker thread and tens of MB each.
+
+    State is per process, like the caches: each gunicorn worker enforces
+    the limits on the attempts it receives.
+    """
+
+    def __init__(self, rate=5 / 60, burst=5, global_rate=1.0, global_burst=20,
+                 lockout_after=5, lockout_base=30.0, lockout_max=3600.0,
+                 max_clients=10000, hash_slots=2, hash_wait=1.0):
+        self.rate = rate
+        self.burst = burst
+        self.lockout_after = lockout_after
+        self.lockout_base = lockout_base
+        self.lockout_max = lockout_max
+        self.max_clients = max_clients
+        self.hash_wait = hash_wait
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()
+        self._global = TokenBucket(global_rate, global_burst, time.monotonic())
+        self._slots = threading.BoundedSemaphore(hash_slots)
+        self._hashing = 0
+        self.throttled = {"locked": 0, "ip_rate": 0, "global_rate": 0, "busy": 0}
+
+    def _client(self, ip, now):
+        client = self._clients.get(ip)
+        if client is None:
+            client = self._clients[ip] = _Client(TokenBucket(self.rate, self.burst, now))
+            if len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(ip)
+            if client.failures and now - client.last_failure > self.lockout_max:
+                client.failures = 0
+        return client
+
+    def _reject(self, reason, wait):
+        self.throttled[reason] += 1
+        return reason, max(1, int(wait + 0.999))
+
+    def check(self, ip):
+        """(None, 0) if ``ip`` may try a password now, else (reason, seconds to wait)."""
+        now = time.monotonic()
+        with self._lock:
+            client = self._client(ip, now)
+            if client.locked_until > now:
+                return self._reject("locked", client.locked_until - now)
+            # both buckets must have a token before either is spent, so an
+            # attempt refused by the global limit costs the client nothing
+            wait = client.bucket.wait(now)
+            if wait:
+                return self._reject("ip_rate", wait)
+            wait = self._global.wait(now)
+            if wait:
+                return self._reject("global_rate", wait)
+            client.bucket.take(now)
+            self._global.take(now)
+        return None, 0
+
+    def verify(self, check):
+        """Run ``check()`` in a hash slot; None if no slot freed up within ``hash_wait``."""
+        if not self._slots.acquire(timeout=self.hash_wait):
+            with self._lock:
+                self.throttled["busy"] += 1
+            return None
+        try:
+            with self._lock:
+                self._hashing += 1
+            return check()
+        finally:
+            with self._lock:
+                self._hashing -= 1
+            self._slots.release()
+
+    def failed(self, ip):
+        now = time.monotonic()
+        with self._lock:
+            client = self._client(ip, now)
+            client.failures += 1
+            client.last_failure = now
+            extra = client.failures - self.lockout_after
+            if extra >= 0:
+                client.locked_until = now + min(self.lockout_max, self.lockout_base * 2 ** extra)
+
+    def succeeded(self, ip):
+        with self._lock:
+            self._clients.pop(ip, None)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "locked_out": sum(1 for c in self._clients.values() if c.locked_until > now),
+                "hashing": self._hashing,
+                **{f"throttled_{reason}": n for reason, n in self.throttled.items()},
+            }
+
+
+def client_ip(request, trusted_proxies=0):
+    """The caller's address: ``remote_addr``, or the X-Forwarded-For entry added by the
+    outermost of ``trusted_proxies`` proxies (entries further left can be forged)."""
+    if trusted_proxies:
+        forwarded = [a.strip() for a in request.headers.get("X-Forwarded-For", "").split(",") if a.strip()]
+        if len(forwarded) >= trusted_proxies:
+            return forwarded[-trusted_proxies]
+    return request.remote_addr or "unknown"